@@ -1,10 +1,85 @@
 import os
 import sys
-from clang import cindex
-#cindex.Config.set_library_file('/opt/homebrew/Cellar/llvm/20.1.2/lib/libclang.dylib')
-#cindex.Config.set_library_file('/usr/lib/llvm-12/lib/libclang.so.1')
-cindex.Config.set_library_file(f"{os.environ['CONDA_PREFIX']}/lib/libclang.so")
-from clang.cindex import Index, CursorKind, TranslationUnit
+import json
+import time
+import shlex
+try:
+    from clang import cindex
+    #cindex.Config.set_library_file('/opt/homebrew/Cellar/llvm/20.1.2/lib/libclang.dylib')
+    #cindex.Config.set_library_file('/usr/lib/llvm-12/lib/libclang.so.1')
+    cindex.Config.set_library_file(f"{os.environ['CONDA_PREFIX']}/lib/libclang.so")
+    from clang.cindex import Index, CursorKind, TranslationUnit, Diagnostic
+    HAS_LIBCLANG = True
+except (ImportError, KeyError):
+    # without libclang only the scanner backend in cfile_scan.py is usable
+    HAS_LIBCLANG = False
+
+
+# compiler flags that change what libclang sees, everything else in a compile command is dropped
+PATH_FLAGS = ('-I', '-isystem', '-iquote', '-idirafter', '-include')
+KEEP_FLAGS = PATH_FLAGS + ('-D', '-U', '-std=')
+
+
+def _filter_compile_flags(arguments, directory):
+    flags = []
+    i = 0
+    while i < len(arguments):
+        arg = arguments[i]
+        flag = next((x for x in KEEP_FLAGS if arg.startswith(x)), None)
+        if flag is None or arg.startswith('-include-pch'):
+            i += 1
+            continue
+        
+        value = arg[len(flag):]
+        if not value and flag != '-std=' and i + 1 < len(arguments):
+            i += 1
+            value = arguments[i]
+        
+        if flag in PATH_FLAGS and not os.path.isabs(value):
+            value = os.path.normpath(os.path.join(directory, value))
+        
+        if flag in ('-isystem', '-iquote', '-idirafter', '-include'):
+            flags.extend([flag, value])
+        else:
+            flags.append(flag + value)
+        i += 1
+    
+    return flags
+
+
+def load_compile_commands(proj_dir):
+    '''
+    Read per-file flags from <proj_dir>/compile_commands.json and repo-wide flags
+    from <proj_dir>/compile_flags.txt (one flag per line), when present.
+    Returns (repo_args, {abs file path: file_args}).
+    '''
+    repo_args = []
+    file_args = {}
+    
+    flags_file = os.path.join(proj_dir, 'compile_flags.txt')
+    if os.path.isfile(flags_file):
+        with open(flags_file, 'r') as f:
+            arguments = [x.strip() for x in f.readlines() if x.strip()]
+        repo_args = _filter_compile_flags(arguments, proj_dir)
+    
+    db_file = os.path.join(proj_dir, 'compile_commands.json')
+    if os.path.isfile(db_file):
+        try:
+            with open(db_file, 'r') as f:
+                commands = json.load(f)
+        except Exception as e:
+            print(f"Error reading {db_file}: {e}")
+            commands = []
+        
+        for cmd in commands:
+            directory = cmd.get('directory', proj_dir)
+            arguments = cmd.get('arguments') or shlex.split(cmd.get('command', ''))
+            fpath = cmd.get('file', '')
+            if not os.path.isabs(fpath):
+                fpath = os.path.join(directory, fpath)
+            file_args[os.path.normpath(fpath)] = _filter_compile_flags(arguments[1:], directory)
+    
+    return repo_args, file_args
 
 
 class CAstVisitor(object):
@@ -12,6 +87,8 @@ class CAstVisitor(object):
         self.node_info = {}
         # source code
         self.source_code = None
+        self.source_lines = []
+        self.comment_lines = []
         self.file_path = None
         
         self.COMMENT_KINDS = {CursorKind.MACRO_DEFINITION, CursorKind.INCLUSION_DIRECTIVE}
@@ -20,6 +97,8 @@ class CAstVisitor(object):
     def clear(self):
         self.node_info = {}
         self.source_code = None
+        self.source_lines = []
+        self.comment_lines = []
         self.file_path = None
 
 
@@ -30,6 +109,14 @@ class CAstVisitor(object):
     def set_code(self, source_code, file_path):
         self.source_code = source_code
         self.file_path = file_path
+        # decode once per file, every extraction then only touches its own lines
+        if source_code:
+            self.source_lines = source_code.decode('utf-8', errors='ignore').splitlines()
+        else:
+            self.source_lines = []
+        
+        # comment flag per line, so docstring lookup never touches tokens or other cursors
+        self.comment_lines = [x.lstrip().startswith(('/*', '//')) for x in self.source_lines]
 
 
     def _get_code(self, start_location, end_location):
@@ -41,7 +128,7 @@ class CAstVisitor(object):
         end_line = end_location.line - 1
         end_col = end_location.column - 1
 
-        lines = self.source_code.decode('utf-8', errors='ignore').splitlines()
+        lines = self.source_lines
         
         if start_line >= len(lines):
             return ""
@@ -62,6 +149,18 @@ class CAstVisitor(object):
             return '\n'.join(result)
 
 
+    def _starts_body(self, location):
+        # whether the code from location on, blank space skipped, opens a body
+        lines = self.source_lines
+        line, col = location.line - 1, location.column - 1
+        while line < len(lines):
+            text = lines[line][col:].lstrip()
+            if text:
+                return text.startswith('{')
+            line, col = line + 1, 0
+        return False
+
+
     def _save_include_info(self, cursor):
         lineno = cursor.location.line
         include_stmt = cursor.displayname
@@ -90,61 +189,23 @@ class CAstVisitor(object):
 
 
     def _get_docstring(self, cursor):
-        try:
-            has_comment_support = hasattr(CursorKind, 'COMMENT') or hasattr(cursor.kind, 'is_comment')
-            
-            if has_comment_support:
-                comments = []
-                if hasattr(cursor.kind, 'is_comment'):
-                    for c in cursor.get_children():
-                        if c.kind.is_comment():
-                            comments.append(c.spelling)
-                    
-                    tokens = list(cursor.get_tokens())
-                    if tokens:
-                        first_token = tokens[0]
-                        for c in cursor.translation_unit.cursor.get_children():
-                            if c.kind.is_comment() and c.location.line < first_token.location.line:
-                                comments.append(c.spelling)
-                elif hasattr(CursorKind, 'COMMENT'):
-                    for c in cursor.get_children():
-                        if c.kind == CursorKind.COMMENT:
-                            comments.append(c.spelling)
-                    
-                    tokens = list(cursor.get_tokens())
-                    if tokens:
-                        first_token = tokens[0]
-                        for c in cursor.translation_unit.cursor.get_children():
-                            if c.kind == CursorKind.COMMENT and c.location.line < first_token.location.line:
-                                comments.append(c.spelling)
-                
-                if comments:
-                    return "\n".join(comments)
-            
-            tokens = list(cursor.get_tokens())
-            if tokens and self.source_code:
-                first_token = tokens[0]
-                line_no = first_token.location.line
-                
-                lines = self.source_code.decode('utf-8', errors='ignore').splitlines()
-                comments = []
-                
-                for i in range(line_no - 2, max(0, line_no - 5), -1):
-                    if i < len(lines):
-                        line = lines[i].strip()
-                        if line.startswith('/*') or line.startswith('//'):
-                            comments.append(line)
-                        else:
-                            if comments:
-                                break
-                
-                if comments:
-                    return "\n".join(reversed(comments))
-                
-            return None
-        except Exception as e:
-            print(f"Warning: Error getting docstring: {e}")
+        line_no = cursor.extent.start.line
+        if not self.comment_lines or line_no < 1:
             return None
+        
+        # up to three comment lines directly above the declaration
+        comments = []
+        for i in range(line_no - 2, max(0, line_no - 5), -1):
+            if i < len(self.comment_lines):
+                if self.comment_lines[i]:
+                    comments.append(self.source_lines[i].strip())
+                elif comments:
+                    break
+        
+        if comments:
+            return "\n".join(reversed(comments))
+        
+        return None
 
 
     def _get_all_identifiers(self, cursor, save_set):
@@ -178,7 +239,11 @@ class CAstVisitor(object):
         def_content = self._get_code(cursor.extent.start, cursor.extent.end)
         docstring = self._get_docstring(cursor)
         
+        body_content = ""
         for field in cursor.get_children():
+            if field.kind in (CursorKind.FIELD_DECL, CursorKind.CXX_METHOD, CursorKind.CONSTRUCTOR, CursorKind.DESTRUCTOR):
+                body_content += self._get_code(field.extent.start, field.extent.end) + "\n"
+            
             if field.kind == CursorKind.FIELD_DECL:
                 field_name = field.spelling
                 if field_name:
@@ -205,11 +270,6 @@ class CAstVisitor(object):
         
         if docstring:
             self.node_info[struct_name]["docstring"] = docstring
-            
-        body_content = ""
-        for child in cursor.get_children():
-            if child.kind in (CursorKind.FIELD_DECL, CursorKind.CXX_METHOD, CursorKind.CONSTRUCTOR, CursorKind.DESTRUCTOR):
-                body_content += self._get_code(child.extent.start, child.extent.end) + "\n"
         
         if body_content:
             self.node_info[struct_name]["body"] = body_content
@@ -217,7 +277,7 @@ class CAstVisitor(object):
         return struct_name
 
 
-    def _process_function_declaration(self, cursor, has_body=False):
+    def _process_function_declaration(self, cursor, body_cursor=None):
         func_name = cursor.spelling
         if not func_name:
             return None
@@ -226,20 +286,11 @@ class CAstVisitor(object):
         
         return_type = cursor.result_type.spelling
         
-        if has_body:
+        if body_cursor is not None:
             docstring = self._get_docstring(cursor)
             
-            body_start = None
-            for child in cursor.get_children():
-                if child.kind == CursorKind.COMPOUND_STMT:
-                    body_start = child.extent.start
-                    body_content = self._get_code(child.extent.start, child.extent.end)
-                    break
-
-            if body_start:
-                def_content = self._get_code(cursor.extent.start, body_start).rstrip()
-            else:
-                def_content = self._get_code(cursor.extent.start, cursor.extent.end)
+            body_content = self._get_code(body_cursor.extent.start, body_cursor.extent.end)
+            def_content = self._get_code(cursor.extent.start, body_cursor.extent.start).rstrip()
             
             self.node_info[func_name] = {
                 "type": "Function",
@@ -256,18 +307,29 @@ class CAstVisitor(object):
             if return_type and return_type != "void":
                 self.node_info[func_name]["rels"] = [[return_type, "Typeof"]]
                 
-            for child in cursor.get_children():
-                if child.kind == CursorKind.COMPOUND_STMT:
-                    self._process_function_body(child, func_name)
+            self._process_function_body(body_cursor, func_name)
                     
         else:
             def_content = self._get_code(cursor.extent.start, cursor.extent.end)
+            # a body skipped by the parser is cut from the extent, which then ends at the declarator
+            if '{' in def_content and cursor.is_definition():
+                def_content = def_content[:def_content.index('{')].rstrip()
+                body_skipped = True
+            else:
+                body_skipped = self._starts_body(cursor.extent.end)
             self.node_info[func_name] = {
                 "type": "Function",
                 "def": def_content,
                 "sline": lineno
             }
             
+            # a skipped definition still has its comment, body_skipped tells it from a prototype
+            if body_skipped:
+                docstring = self._get_docstring(cursor)
+                if docstring:
+                    self.node_info[func_name]["docstring"] = docstring
+                self.node_info[func_name]["body_skipped"] = True
+            
             if return_type and return_type != "void":
                 self.node_info[func_name]["rels"] = [[return_type, "Typeof"]]
                 
@@ -386,27 +448,29 @@ class CAstVisitor(object):
     def visit_root(self, cursor):
         file_path = ""  
         self.node_info[file_path] = {"type": "Module"}
-
-        for child in cursor.get_children():
-            if child.kind == CursorKind.MACRO_DEFINITION and child.location.file and child.location.file.name == self.file_path:
-                tokens = list(child.get_tokens())
-                if tokens and tokens[0].spelling.startswith('/*'):
-                    self.node_info[file_path]["docstring"] = tokens[0].spelling
-                break
         
+        # module docstring is only looked up on the first macro of the file
+        first_macro = True
         for child in cursor.get_children():
             if not child.location.file or child.location.file.name != self.file_path:
                 continue
+            
+            if child.kind == CursorKind.MACRO_DEFINITION:
+                if first_macro:
+                    first_macro = False
+                    tokens = list(child.get_tokens())
+                    if tokens and tokens[0].spelling.startswith('/*'):
+                        self.node_info[file_path]["docstring"] = tokens[0].spelling
                 
-            if child.kind == CursorKind.INCLUSION_DIRECTIVE:
+            elif child.kind == CursorKind.INCLUSION_DIRECTIVE:
                 self._save_include_info(child)
                 
             elif child.kind == CursorKind.VAR_DECL:
                 self._process_variable_declaration(child)
                 
             elif child.kind == CursorKind.FUNCTION_DECL:
-                has_body = any(c.kind == CursorKind.COMPOUND_STMT for c in child.get_children())
-                self._process_function_declaration(child, has_body)
+                body_cursor = next((c for c in child.get_children() if c.kind == CursorKind.COMPOUND_STMT), None)
+                self._process_function_declaration(child, body_cursor)
                 
             elif child.kind == CursorKind.TYPEDEF_DECL:
                 self._process_typedef(child)
@@ -421,35 +485,126 @@ class CAstVisitor(object):
                 self._process_struct_declaration(child, 'Enum')
 
 
+# full: parse everything, headers: skip function bodies in headers, decl: skip them everywhere
+PARSE_MODES = ('full', 'headers', 'decl')
+
+# bump when the produced node_info changes, it is part of the parse cache key
+PARSER_VERSION = 2
+
+# fatal diagnostics of a pch that is stale, missing or corrupted
+PCH_ERRORS = ('precompiled header', 'pch file', 'ast file')
+
+
 class CParser(object):
-    def __init__(self):
+    def __init__(self, parse_mode='full'):
+        if parse_mode not in PARSE_MODES:
+            raise ValueError(f"Unknown parse mode: {parse_mode}")
         
+        self.parse_mode = parse_mode
+        self.version = PARSER_VERSION
         self.index = Index.create()
+        # {"parse": seconds in libclang, "visit": seconds in CAstVisitor} of the last file
+        self.last_timing = None
         self.visitor = CAstVisitor()
         self.file_path = None
+        self.args = ['-x', 'c', 
+                     '-Xclang', '-detailed-preprocessing-record']
+        
+        # per-project flags, see set_project_args
+        self.repo_args = []
+        self.file_args = {}
+        self.pch_file = None
     
     def set_file_path(self, file_path):
         self.file_path = file_path
     
+    def set_project_args(self, repo_args=None, file_args=None, pch_file=None):
+        self.repo_args = repo_args or []
+        self.file_args = file_args or {}
+        self.pch_file = pch_file
+    
+    def has_file_args(self, c_file):
+        return os.path.normpath(os.path.abspath(c_file)) in self.file_args
+    
+    def get_file_args(self, c_file):
+        # flags from compile_commands.json win over the repo-wide ones
+        if self.has_file_args(c_file):
+            return self.file_args[os.path.normpath(os.path.abspath(c_file))]
+        return self.repo_args
+    
+    def get_args(self, c_file):
+        args = self.args + self.get_file_args(c_file)
+        
+        # the pch is only valid for the repo-wide flags, and a header inside the pch
+        # would be hidden by its own include guard, so only plain sources use it
+        if self.pch_file and not self.has_file_args(c_file) and c_file.endswith(('.c', '.cpp')):
+            args = args + ['-include-pch', self.pch_file]
+        
+        return args
+    
+    def get_parse_options(self, c_file):
+        if self.parse_mode == 'decl' or (self.parse_mode == 'headers' and c_file.endswith(('.h', '.hpp'))):
+            return TranslationUnit.PARSE_SKIP_FUNCTION_BODIES | TranslationUnit.PARSE_INCOMPLETE
+        return 0
+    
+    def get_file_options(self, c_file):
+        # everything besides the content that shapes the parse of c_file, for the parse cache key
+        args = self.get_args(c_file)
+        use_pch = '-include-pch' in args
+        if use_pch:
+            args = args[:args.index('-include-pch')]
+        return {"args": args, "pch": use_pch, "options": self.get_parse_options(c_file)}
+    
+    def build_pch(self, headers, pch_file):
+        prelude = os.path.splitext(pch_file)[0] + '.h'
+        with open(prelude, 'w') as f:
+            for header in headers:
+                f.write(f'#include "{header}"\n')
+        
+        args = ['-x', 'c-header'] + self.args[2:] + self.repo_args
+        try:
+            tu = self.index.parse(prelude, args=args, options=TranslationUnit.PARSE_INCOMPLETE)
+            if not tu or any(d.severity >= Diagnostic.Error for d in tu.diagnostics):
+                print(f"Skip precompiled header {pch_file}, common headers do not compile standalone")
+                return None
+            
+            tu.save(pch_file)
+            # every file clang checks when it loads the pch, the transitive includes included
+            return sorted({os.path.abspath(x.include.name) for x in tu.get_includes()} | {os.path.abspath(x) for x in headers})
+        except Exception as e:
+            print(f"Error building precompiled header {pch_file}, Error: {e}")
+            return None
+    
     def parse(self, c_file):
+        self.last_timing = None
         try:
             with open(c_file, 'rb') as f:
                 source_code = f.read()
             
-            args = ['-x', 'c', 
-                   '-Xclang', '-detailed-preprocessing-record'] 
-            tu = self.index.parse(c_file, args=args, unsaved_files=[(c_file, source_code.decode('utf-8', errors='ignore'))])
+            start_time = time.perf_counter()
+            tu = self.index.parse(c_file, args=self.get_args(c_file), 
+                                  unsaved_files=[(c_file, source_code.decode('utf-8', errors='ignore'))], 
+                                  options=self.get_parse_options(c_file))
             
             if not tu:
                 print(f"Error parsing file: {c_file}, Could not create translation unit")
                 return {}
             
+            # a pch clang refuses leaves a degraded AST, which must not pass for a parse result
+            pch_errors = [d.spelling for d in tu.diagnostics if d.severity >= Diagnostic.Fatal 
+                          and any(x in d.spelling.lower() for x in PCH_ERRORS)]
+            if pch_errors:
+                print(f"Error parsing file: {c_file}, Precompiled header rejected: {pch_errors[0]}")
+                return {}
+            
+            parse_time = time.perf_counter()
             self.visitor.clear()
             self.visitor.set_code(source_code, c_file)
 
             self.visitor.visit_root(tu.cursor)
             
             file_info = self.visitor.get_info()
+            self.last_timing = {"parse": parse_time - start_time, "visit": time.perf_counter() - parse_time}
             
             if "" in file_info:
                 file_info[""]["file_path"] = os.path.abspath(c_file)
@@ -0,0 +1,651 @@
+import os
+import re
+import time
+from bisect import bisect_right
+
+
+# tokens of a C file; preprocessor lines are kept whole so their content never leaks into declarations
+TOKEN_PATTERN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<pp>^[ \t]*\#(?:[^\n\\]|\\.)*)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<number>\.?\d(?:[\w.]|[eEpP][+-])*)
+  | (?P<space>[^\S\n]+|\n)
+  | (?P<punct>->|\.\.\.|\S)
+''', re.S | re.M | re.X)
+
+INCLUDE_PATTERN = re.compile(r'#\s*include\s*[<"]([^>"]+)[>"]')
+
+STORAGE_WORDS = {'static', 'extern', 'register', 'auto', 'inline', '__inline', '__inline__', 'typedef', '_Thread_local'}
+TYPE_WORDS = {
+    'void', 'char', 'short', 'int', 'long', 'float', 'double', 'signed', 'unsigned', '_Bool', '_Complex',
+    'const', 'volatile', 'restrict', '__restrict', 'struct', 'union', 'enum'
+}
+KEYWORDS = STORAGE_WORDS | TYPE_WORDS | {
+    'sizeof', 'return', 'if', 'else', 'for', 'while', 'do', 'switch', 'case', 'default',
+    'break', 'continue', 'goto', '__attribute__', '__asm__', 'asm', '_Alignof', '_Alignas'
+}
+
+# attributes and asm labels wrapped around a declarator, skipped together with their parentheses
+ATTRIBUTE_WORDS = {'__attribute__', '__declspec', '__asm__', '__asm', 'asm', '_Alignas'}
+
+# bump when the produced node_info changes, it is part of the parse cache key
+SCANNER_VERSION = 3
+
+AGGREGATE_TYPES = {'struct': 'Struct', 'union': 'Union', 'enum': 'Enum'}
+OPEN_BRACKETS = {'(': ')', '[': ']', '{': '}'}
+CLOSE_BRACKETS = {v: k for k, v in OPEN_BRACKETS.items()}
+
+
+class Token(object):
+    __slots__ = ('kind', 'text', 'start', 'end', 'line')
+
+    def __init__(self, kind, text, start, end, line):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+        self.line = line
+
+
+class CScanVisitor(object):
+    '''
+    Scans a C file without libclang and fills node_info with the same schema as
+    CAstVisitor. Declarations are recognised from their token shape, so macros
+    and conditional compilation are not expanded.
+    '''
+    def __init__(self):
+        self.node_info = {}
+        self.text = ""
+        self.source_lines = []
+        self.comment_lines = []
+        self.tokens = []
+        self.pp_tokens = []
+        self.keep_body = True
+
+    def clear(self):
+        self.node_info = {}
+        self.text = ""
+        self.source_lines = []
+        self.comment_lines = []
+        self.tokens = []
+        self.pp_tokens = []
+
+    def get_info(self):
+        return self.node_info
+
+    def set_code(self, source_code, keep_body=True):
+        self.text = source_code.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        self.source_lines = self.text.split('\n')
+        self.comment_lines = [x.lstrip().startswith(('/*', '//')) for x in self.source_lines]
+        self.keep_body = keep_body
+
+        line_starts = [0]
+        for m in re.finditer('\n', self.text):
+            line_starts.append(m.end())
+
+        self.tokens = []
+        self.pp_tokens = []
+        for m in TOKEN_PATTERN.finditer(self.text):
+            kind = m.lastgroup
+            if kind in ('space', 'comment'):
+                continue
+            token = Token(kind, m.group(), m.start(), m.end(), bisect_right(line_starts, m.start()))
+            if kind == 'pp':
+                self.pp_tokens.append(token)
+            else:
+                self.tokens.append(token)
+
+    def _get_code(self, first, last):
+        return self.text[self.tokens[first].start:self.tokens[last].end]
+
+    def _get_docstring(self, line_no):
+        comments = []
+        for i in range(line_no - 2, max(0, line_no - 5), -1):
+            if i < len(self.comment_lines):
+                if self.comment_lines[i]:
+                    comments.append(self.source_lines[i].strip())
+                elif comments:
+                    break
+
+        if comments:
+            return "\n".join(reversed(comments))
+
+        return None
+
+    def _match_close(self, i, end):
+        # index of the bracket closing tokens[i], or end - 1 when unbalanced
+        open_text = self.tokens[i].text
+        close_text = OPEN_BRACKETS[open_text]
+        depth = 0
+        for j in range(i, end):
+            text = self.tokens[j].text
+            if text == open_text:
+                depth += 1
+            elif text == close_text:
+                depth -= 1
+                if depth == 0:
+                    return j
+        return end - 1
+
+    def _match_open(self, i, first):
+        # index of the bracket opening tokens[i], None when unbalanced
+        close_text = self.tokens[i].text
+        open_text = CLOSE_BRACKETS[close_text]
+        depth = 0
+        for j in range(i, first - 1, -1):
+            text = self.tokens[j].text
+            if text == close_text:
+                depth += 1
+            elif text == open_text:
+                depth -= 1
+                if depth == 0:
+                    return j
+        return None
+
+    def _split_top(self, first, end, sep):
+        # split [first, end) at separators outside any bracket
+        parts = []
+        start = first
+        i = first
+        while i < end:
+            text = self.tokens[i].text
+            if text in OPEN_BRACKETS:
+                i = self._match_close(i, end) + 1
+                continue
+            if text == sep:
+                parts.append((start, i))
+                start = i + 1
+            i += 1
+        if start < end:
+            parts.append((start, end))
+        return parts
+
+    def _find_top(self, first, end, texts):
+        i = first
+        while i < end:
+            text = self.tokens[i].text
+            if text in texts:
+                return i
+            if text in OPEN_BRACKETS:
+                i = self._match_close(i, end) + 1
+                continue
+            i += 1
+        return None
+
+    def _declarator_name(self, first, end):
+        # (*name)(...) for function pointers, else the last identifier before =, [ or :
+        init = self._find_top(first, end, ('=',))
+        i = first
+        while i < (end if init is None else init) - 1:
+            if self.tokens[i].text == '{':
+                i = self._match_close(i, end) + 1
+                continue
+            if self.tokens[i].text == '(' and self.tokens[i + 1].text == '*':
+                close = self._match_close(i, end)
+                for j in range(close - 1, i, -1):
+                    if self.tokens[j].kind == 'name' and self.tokens[j].text not in KEYWORDS:
+                        return j
+            i += 1
+
+        stop = self._find_top(first, end, ('=', '[', ':'))
+        if stop is None:
+            stop = end
+        i = first
+        name_index = None
+        while i < stop:
+            token = self.tokens[i]
+            if token.text in OPEN_BRACKETS:
+                i = self._match_close(i, stop) + 1
+                continue
+            if token.kind == 'name' and token.text not in KEYWORDS:
+                name_index = i
+            i += 1
+        return name_index
+
+    def _type_spelling(self, first, end, skip, drop_storage=True):
+        # tokens outside braces, initializers and bit widths, without the declared name
+        stop = self._find_top(first, end, ('=', ':'))
+        if stop is None:
+            stop = end
+        words = []
+        i = first
+        while i < stop:
+            token = self.tokens[i]
+            if token.text == '{':
+                i = self._match_close(i, stop) + 1
+                continue
+            if i != skip and not (drop_storage and token.text in STORAGE_WORDS):
+                words.append(token.text)
+            i += 1
+        spelling = re.sub(r'\*\s+(?=\*)', '*', ' '.join(words))
+        spelling = re.sub(r'\s*([\[\]])\s*', r'\1', spelling)
+        return spelling.replace('( ', '(').replace(' )', ')')
+
+    def _next_declarator_type(self, spec_first, spec_end, spec_name, d_first, name_index, drop_storage=True):
+        # `int *a, b` : b shares the specifiers of a but not its pointer
+        base_type = self._type_spelling(spec_first, spec_end, spec_name, drop_storage).rstrip(' *')
+        stars = sum(1 for i in range(d_first, name_index) if self.tokens[i].text == '*')
+        return f"{base_type} {'*' * stars}" if stars else base_type
+
+    def _save_include_info(self, token):
+        m = INCLUDE_PATTERN.match(token.text.strip())
+        if not m:
+            return
+
+        header_name = m.group(1)
+        header_base = os.path.splitext(os.path.basename(header_name))[0]
+        if header_base:
+            self.node_info[header_base] = {
+                "type": "Variable",
+                "def": f"#include {header_name}",
+                "sline": token.line,
+                "include": [header_name]
+            }
+
+    def _process_fields(self, struct_name, first, end):
+        body_content = ""
+        for f_first, f_end in self._split_top(first, end, ';'):
+            decls = self._split_top(f_first, f_end, ',')
+            spec_end = decls[0][1]
+            spec_name = self._declarator_name(f_first, spec_end)
+            if spec_name is None:
+                continue
+            body_content += self._get_code(f_first, f_end - 1) + "\n"
+
+            for d_first, d_end in decls:
+                name_index = self._declarator_name(d_first, d_end)
+                if name_index is None:
+                    continue
+
+                qualified_name = f"{struct_name}.{self.tokens[name_index].text}"
+                self.node_info[qualified_name] = {
+                    "type": "Variable",
+                    "def": self._get_code(f_first, d_end - 1),
+                    "sline": self.tokens[name_index].line,
+                    "in_struct": struct_name
+                }
+
+                if d_first == f_first:
+                    type_name = self._type_spelling(d_first, d_end, name_index, False)
+                else:
+                    type_name = self._next_declarator_type(f_first, spec_end, spec_name, d_first, name_index, False)
+                if type_name:
+                    self.node_info[qualified_name]["rels"] = [[type_name, "Typeof"]]
+
+        return body_content
+
+    def _process_aggregate(self, kw_index, end, name=None):
+        # struct/union/enum starting at kw_index; returns the index after its closing brace
+        struct_type = AGGREGATE_TYPES[self.tokens[kw_index].text]
+        i = kw_index + 1
+        tag_index = None
+        if i < end and self.tokens[i].kind == 'name' and self.tokens[i].text not in KEYWORDS:
+            tag_index = i
+            i += 1
+
+        if i >= end or self.tokens[i].text != '{':
+            return None
+
+        close = self._match_close(i, end)
+        struct_name = name or (self.tokens[tag_index].text if tag_index is not None else f"anon_{struct_type}_{self.tokens[kw_index].line}")
+        name_token = self.tokens[tag_index if tag_index is not None else kw_index]
+
+        body_content = ""
+        if struct_type != 'Enum':
+            body_content = self._process_fields(struct_name, i + 1, close)
+
+        self.node_info[struct_name] = {
+            "type": struct_type,
+            "def": self._get_code(kw_index, close),
+            "sline": name_token.line
+        }
+
+        docstring = self._get_docstring(self.tokens[kw_index].line)
+        if docstring:
+            self.node_info[struct_name]["docstring"] = docstring
+        if body_content:
+            self.node_info[struct_name]["body"] = body_content
+
+        return close + 1
+
+    def _process_typedef(self, first, end):
+        name_index = self._declarator_name(first, end)
+        if name_index is None:
+            return
+
+        new_type_name = self.tokens[name_index].text
+        kw_index = next((i for i in range(first, name_index) if self.tokens[i].text in AGGREGATE_TYPES), None)
+        anonymous = kw_index is not None and kw_index + 1 < end and self.tokens[kw_index + 1].text == '{'
+
+        if kw_index is not None and not anonymous:
+            self._process_aggregate(kw_index, end)
+
+        entry = {
+            "type": "Variable",
+            "def": self._get_code(first, end - 1),
+            "sline": self.tokens[name_index].line
+        }
+
+        docstring = self._get_docstring(self.tokens[first].line)
+        if docstring:
+            entry["docstring"] = docstring
+
+        underlying_type = self._type_spelling(first, end, name_index)
+        if underlying_type and underlying_type != new_type_name:
+            entry["rels"] = [[underlying_type, "Typeof"]]
+
+        self.node_info[new_type_name] = entry
+
+        if anonymous:
+            self._process_aggregate(kw_index, end, new_type_name)
+            self.node_info[new_type_name].pop("docstring", None)
+
+    def _process_variables(self, first, end):
+        decls = self._split_top(first, end, ',')
+        spec_first, spec_end = decls[0]
+        spec_name = self._declarator_name(spec_first, spec_end)
+
+        for d_first, d_end in decls:
+            name_index = self._declarator_name(d_first, d_end)
+            if name_index is None:
+                continue
+
+            var_name = self.tokens[name_index].text
+            entry = {
+                "type": "Variable",
+                "def": self._get_code(first, d_end - 1),
+                "sline": self.tokens[name_index].line
+            }
+
+            if d_first == spec_first:
+                type_name = self._type_spelling(d_first, d_end, name_index)
+            else:
+                type_name = self._next_declarator_type(spec_first, spec_end, spec_name, d_first, name_index)
+            if type_name:
+                entry["rels"] = [[type_name, "Typeof"]]
+
+            # initializer lists are skipped the same way CAstVisitor skips INIT_LIST_EXPR
+            eq = self._find_top(d_first, d_end, ('=',))
+            if eq is not None and eq + 1 < d_end and self.tokens[eq + 1].text != '{':
+                referred_ids = set(x.text for x in self.tokens[eq + 1:d_end]
+                                   if x.kind == 'name' and x.text not in KEYWORDS and x.text != var_name)
+                if referred_ids:
+                    entry.setdefault("rels", [])
+                    for ref_id in referred_ids:
+                        entry["rels"].append([ref_id, "Assign"])
+
+            self.node_info[var_name] = entry
+
+    def _process_function(self, first, end, paren, body=None):
+        name_index = paren - 1
+        func_name = self.tokens[name_index].text
+
+        entry = {
+            "type": "Function",
+            "def": self._get_code(first, (body if body is not None else end) - 1).rstrip(),
+            "sline": self.tokens[name_index].line
+        }
+
+        if body is not None:
+            docstring = self._get_docstring(self.tokens[first].line)
+            if docstring:
+                entry["docstring"] = docstring
+            if self.keep_body:
+                entry["body"] = self._get_code(body, self._match_close(body, len(self.tokens)))
+            else:
+                entry["body_skipped"] = True
+
+        if body is not None and self.tokens[body - 1].text == ';':
+            # K&R parameter declarations are not part of the return type
+            decl_end = self._match_close(paren, body) + 1
+        else:
+            decl_end = end
+        return_type = self._return_type(first, decl_end, paren)
+        if return_type and return_type != "void":
+            entry["rels"] = [[return_type, "Typeof"]]
+
+        self.node_info[func_name] = entry
+
+    def _return_type(self, first, end, paren):
+        # the function declarator in [first, end) without its name, parameters, attributes and macro calls
+        close = self._match_close(paren, end)
+        while end - 1 > close and self.tokens[end - 1].kind == 'name' and self.tokens[end - 1].text not in KEYWORDS \
+                and self.tokens[end - 2].text == ')':
+            end -= 1
+        words = []
+        i = first
+        while i < end:
+            token = self.tokens[i]
+            if i == paren:
+                i = close + 1
+                continue
+            if i + 1 < end and self.tokens[i + 1].text == '(' and (token.text in ATTRIBUTE_WORDS 
+                                                                  or token.kind == 'name' and token.text not in KEYWORDS):
+                i = self._match_close(i + 1, end) + 1
+                continue
+            if token.text not in STORAGE_WORDS:
+                words.append(token.text)
+            i += 1
+        spelling = re.sub(r'\*\s+(?=\*)', '*', ' '.join(words))
+        return spelling.replace('( ', '(').replace(' )', ')').replace(') (', ')(')
+
+    def _get_function_paren(self, first, end):
+        # the parameter list of the function declarator ending right before end, None for variables
+        # and function pointers. For (*name(params))(params) it is the parameter list of name
+        if self._find_top(first, end, ('=',)) is not None:
+            return None
+
+        close = end - 1
+        while close > first:
+            token = self.tokens[close]
+            if token.kind == 'name' and token.text not in KEYWORDS and self.tokens[close - 1].text == ')':
+                # an attribute macro after the parameters
+                close -= 1
+                continue
+            if token.text != ')':
+                return None
+
+            paren = self._match_open(close, first)
+            if paren is None or paren == first:
+                return None
+            before = self.tokens[paren - 1]
+            if before.text in ATTRIBUTE_WORDS or before.text == ')':
+                # skip the attribute, or step into the declarator group before the parameters
+                close = paren - 2
+            elif before.kind == 'name' and before.text not in KEYWORDS:
+                return paren
+            else:
+                return None
+
+        return None
+
+    def _get_knr_definition(self, first, end):
+        # int f(a, b) int a; char *b; { ... } : (identifier list, body) when the first parameter
+        # declaration ends at end, None otherwise
+        tokens = self.tokens
+        if not any(tokens[j].text == ')' and tokens[j + 1].kind == 'name' and tokens[j + 1].text not in ATTRIBUTE_WORDS
+                   for j in range(first, end - 1)):
+            return None
+
+        paren = None
+        i = first
+        while i < end:
+            if self.tokens[i].text in OPEN_BRACKETS:
+                close = self._match_close(i, end)
+                if self.tokens[i].text == '(' and i > first and close + 1 < end \
+                        and self.tokens[i - 1].kind == 'name' and self.tokens[i - 1].text not in KEYWORDS \
+                        and self.tokens[close + 1].kind == 'name' \
+                        and all(x.text == ',' if k % 2 else x.kind == 'name' and x.text not in KEYWORDS
+                                for k, x in enumerate(self.tokens[i + 1:close])):
+                    paren = i
+                i = close + 1
+                continue
+            i += 1
+        if paren is None:
+            return None
+
+        n = len(self.tokens)
+        i = end + 1
+        while i < n:
+            text = self.tokens[i].text
+            if text == '{':
+                return (paren, i) if self.tokens[i - 1].text == ';' else None
+            if text in ('}', '='):
+                return None
+            if text in ('(', '['):
+                i = self._match_close(i, n)
+            i += 1
+        return None
+
+    def _process_statement(self, first, end):
+        # a top-level declaration in [first, end), without the trailing ';'
+        if first >= end:
+            return
+
+        if self.tokens[first].text == 'typedef':
+            self._process_typedef(first, end)
+            return
+
+        paren = self._get_function_paren(first, end)
+        if paren is not None:
+            self._process_function(first, end, paren)
+            return
+
+        kw_index = next((i for i in range(first, end) if self.tokens[i].text in AGGREGATE_TYPES), None)
+        if kw_index is not None and all(self.tokens[i].text in STORAGE_WORDS | TYPE_WORDS for i in range(first, kw_index)):
+            after = self._process_aggregate(kw_index, end)
+            if after is None:
+                if end - kw_index == 2:
+                    # forward declaration
+                    self.node_info[self.tokens[kw_index + 1].text] = {
+                        "type": AGGREGATE_TYPES[self.tokens[kw_index].text],
+                        "def": self._get_code(kw_index, end - 1),
+                        "sline": self.tokens[kw_index + 1].line
+                    }
+                    return
+            elif after >= end:
+                return
+
+        self._process_variables(first, end)
+
+    def visit_root(self):
+        self.node_info[""] = {"type": "Module"}
+
+        for token in self.pp_tokens:
+            if INCLUDE_PATTERN.match(token.text.strip()):
+                self._save_include_info(token)
+
+        tokens = self.tokens
+        n = len(tokens)
+        start = 0
+        i = 0
+        while i < n:
+            text = tokens[i].text
+
+            # extern "C" { is transparent, its stray closing brace is dropped below
+            if text == 'extern' and i + 2 < n and tokens[i + 1].kind == 'string' and tokens[i + 2].text == '{':
+                i += 3
+                start = i
+                continue
+
+            if text == '}' or (text == ';' and start == i):
+                i += 1
+                start = i
+                continue
+
+            if text == ';':
+                knr = self._get_knr_definition(start, i)
+                if knr is not None:
+                    paren, body = knr
+                    self._process_function(start, body, paren, body)
+                    i = self._match_close(body, n) + 1
+                else:
+                    self._process_statement(start, i)
+                    i += 1
+                start = i
+                continue
+
+            if text == '{':
+                close = self._match_close(i, n)
+                paren = self._get_function_paren(start, i)
+                if paren is not None:
+                    self._process_function(start, i, paren, i)
+                # only aggregates and initializers continue after their braces up to a ';'
+                if paren is not None or (self._find_top(start, i, ('=',)) is None 
+                                         and not any(tokens[j].text in AGGREGATE_TYPES for j in range(start, i))):
+                    start = close + 1
+                i = close + 1
+                continue
+
+            if text in ('(', '['):
+                i = self._match_close(i, n) + 1
+                continue
+
+            i += 1
+
+        return self.node_info
+
+
+class CScanParser(object):
+    '''
+    Drop-in for CParser that does not need libclang. Project args and precompiled
+    headers are accepted but ignored since nothing is preprocessed.
+    '''
+    def __init__(self, parse_mode='full'):
+        self.parse_mode = parse_mode
+        self.version = SCANNER_VERSION
+        self.visitor = CScanVisitor()
+        self.last_timing = None
+        self.file_path = None
+        self.args = []
+
+        self.repo_args = []
+        self.file_args = {}
+        self.pch_file = None
+
+    def set_file_path(self, file_path):
+        self.file_path = file_path
+
+    def set_project_args(self, repo_args=None, file_args=None, pch_file=None):
+        self.repo_args = repo_args or []
+        self.file_args = file_args or {}
+
+    def has_file_args(self, c_file):
+        return os.path.normpath(os.path.abspath(c_file)) in self.file_args
+
+    def get_file_args(self, c_file):
+        if self.has_file_args(c_file):
+            return self.file_args[os.path.normpath(os.path.abspath(c_file))]
+        return self.repo_args
+
+    def keep_body(self, c_file):
+        return self.parse_mode == 'full' or (self.parse_mode == 'headers' and not c_file.endswith(('.h', '.hpp')))
+
+    def get_file_options(self, c_file):
+        return {"args": self.get_file_args(c_file), "pch": False, "keep_body": self.keep_body(c_file)}
+
+    def build_pch(self, headers, pch_file):
+        return None
+
+    def parse(self, c_file):
+        self.last_timing = None
+        try:
+            with open(c_file, 'rb') as f:
+                source_code = f.read()
+
+            # tokenizing stands in for the libclang parse, visit_root for the AST walk
+            start_time = time.perf_counter()
+            self.visitor.clear()
+            self.visitor.set_code(source_code, self.keep_body(c_file))
+            parse_time = time.perf_counter()
+            file_info = self.visitor.visit_root()
+            file_info[""]["file_path"] = os.path.abspath(c_file)
+            self.last_timing = {"parse": parse_time - start_time, "visit": time.perf_counter() - parse_time}
+
+            return file_info
+
+        except Exception as e:
+            print(f"Error scanning file: {c_file}, Error: {e}")
+            return {}
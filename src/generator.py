@@ -1,48 +1,138 @@
 import os
 import json
 import re
+from collections import OrderedDict
 
 try:
     from .tokenizer import CModelTokenizer
-    from .utils import MAX_HOP, ONLY_DEF, ENABLE_DOCSTRING, LAST_K_LINES
+    from .graph_binary import BinaryGraph
+    from .graph_sqlite import SQLiteGraph
+    from .graph_shards import ShardedGraph
+    from .graph_store import load_graph, get_graph_path
+    from .path_index import PathIndex
+    from .utils import MAX_HOP, ONLY_DEF, ENABLE_DOCSTRING, LAST_K_LINES, GRAPH_CACHE_MB, INCLUDE_MAP_SUFFIX
 except:
     from tokenizer import CModelTokenizer
-    from utils import MAX_HOP, ONLY_DEF, ENABLE_DOCSTRING, LAST_K_LINES
+    from graph_binary import BinaryGraph
+    from graph_sqlite import SQLiteGraph
+    from graph_shards import ShardedGraph
+    from graph_store import load_graph, get_graph_path
+    from path_index import PathIndex
+    from utils import MAX_HOP, ONLY_DEF, ENABLE_DOCSTRING, LAST_K_LINES, GRAPH_CACHE_MB, INCLUDE_MAP_SUFFIX
+
+
+# loaded json graphs take about 1.5x their file size as slotted nodes
+JSON_MEMORY_FACTOR = 1.5
 
 
 class CGenerator(object):
-    def __init__(self, proj_dir, info_dir, model):
+    def __init__(self, proj_dir, info_dir, model, max_shards=256, cache_bytes=GRAPH_CACHE_MB * 2**20):
         self.proj_dir = os.path.abspath(proj_dir)
         self.info_dir = os.path.abspath(info_dir)
         self.tokenizer = CModelTokenizer(model)
+        self.max_shards = max_shards
         
         self.project = None
         self.proj_info = None
+        self.path_index = None
+        self.include_map = None
+        
+        # {project: (proj_info, estimated bytes when loaded, path index, include map)}, least recently used first.
+        # max_shards also bounds the decoded modules of a binary graph
+        self.cache_bytes = cache_bytes
+        self.graph_cache = OrderedDict()
+        self.cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    def _load_project(self, project):
+        # the format is picked by graph_store.load_graph, the json graph is loaded whole into slotted nodes
+        proj_info, fmt = load_graph(self.info_dir, project, self.max_shards)
+        if fmt is None:
+            return None, 0
+        if fmt == "json":
+            return proj_info, int(os.path.getsize(os.path.join(self.info_dir, f'{project}.json')) * JSON_MEMORY_FACTOR)
+        if fmt == "shards":
+            return proj_info, os.path.getsize(os.path.join(proj_info.shard_dir, 'manifest.json'))
+        return proj_info, os.path.getsize(get_graph_path(self.info_dir, project, fmt))
     
     def _set_project(self, project):
         if project == self.project:
+            self.cache_stats["hits"] += 1
+            self._evict()
             return
-
-        info_file = os.path.join(self.info_dir, f'{project}.json')
-        if not os.path.isfile(info_file):
+        
+        if project in self.graph_cache:
+            self.cache_stats["hits"] += 1
+            self.graph_cache.move_to_end(project)
+            self.project = project
+            self.proj_info, _, self.path_index, self.include_map = self.graph_cache[project]
+            self._evict()
+            return
+        
+        proj_info, nbytes = self._load_project(project)
+        if proj_info is None:
             print(f'未知项目 {project} 在 {self.info_dir}')
             return
         
+        self.cache_stats["misses"] += 1
         self.project = project
-        with open(info_file, 'r') as f:
-            self.proj_info = json.load(f)
+        self.proj_info = proj_info
+        # sqlite and sharded graphs answer suffix lookups themselves
+        self.path_index = None if isinstance(proj_info, (SQLiteGraph, ShardedGraph)) else PathIndex(proj_info)
+        
+        # older graph directories have no include map, the def scan is kept for them
+        self.include_map = None
+        include_file = os.path.join(self.info_dir, f'{project}{INCLUDE_MAP_SUFFIX}')
+        if os.path.isfile(include_file):
+            with open(include_file, 'r') as f:
+                self.include_map = json.load(f)
+            nbytes += int(os.path.getsize(include_file) * JSON_MEMORY_FACTOR)
+        
+        self.graph_cache[project] = (proj_info, nbytes, self.path_index, self.include_map)
+        self._evict()
+    
+    def _get_cache_used(self):
+        # shards and binary graphs keep decoding modules after they were costed, so their
+        # loaded modules are counted on top of the estimate made at load time
+        used = 0
+        for proj_info, nbytes, _, _ in self.graph_cache.values():
+            used += nbytes
+            if isinstance(proj_info, (ShardedGraph, BinaryGraph)):
+                used += int(proj_info.loaded_bytes * JSON_MEMORY_FACTOR)
+        return used
+    
+    def _evict(self):
+        # the current project always stays, even when it alone is over the budget
+        while len(self.graph_cache) > 1 and self._get_cache_used() > self.cache_bytes:
+            _, (old_info, _, _, _) = self.graph_cache.popitem(last=False)
+            if isinstance(old_info, (SQLiteGraph, ShardedGraph, BinaryGraph)):
+                old_info.close()
+            self.cache_stats["evictions"] += 1
+    
+    def get_cache_stats(self):
+        total = self.cache_stats["hits"] + self.cache_stats["misses"]
+        stats = dict(self.cache_stats)
+        stats["hit_rate"] = self.cache_stats["hits"] / total if total else 0.0
+        stats["projects"] = len(self.graph_cache)
+        stats["bytes"] = self._get_cache_used()
+        return stats
     
     def _extract_include_headers(self, source_code):
         user_includes = re.findall(r'#include\s+"([^"]+)"', source_code)
         return user_includes
     
     def _find_header_info(self, header_name):
-        header_paths = []
-        for path in self.proj_info:
-            if path.endswith(header_name):
-                header_paths.append(path)
+        stored = isinstance(self.proj_info, (SQLiteGraph, ShardedGraph))
+        if stored:
+            header_paths = self.proj_info.modules_by_suffix(header_name)
+        else:
+            header_paths = self.path_index.find_suffix(header_name)
         
-        if not header_paths:
+        if not header_paths and self.include_map is not None:
+            # modules including the header, instead of searching it in every definition
+            header_paths = list(self.include_map.get(header_name, {}).get("includers", []))
+        elif not header_paths and stored:
+            header_paths = self.proj_info.modules_with_def(header_name)
+        elif not header_paths:
             for path, info in self.proj_info.items():
                 for entity_name, entity_info in info.items():
                     if entity_info.get('type') == 'Variable' and entity_info.get('def', '').find(header_name) >= 0:
@@ -51,7 +141,9 @@ class CGenerator(object):
         
         functions_info = {}
         for path in header_paths:
-            if path in self.proj_info:
+            if stored:
+                functions_info.update(self.proj_info.get_nodes(path, 'Function'))
+            elif path in self.proj_info:
                 for entity_name, entity_info in self.proj_info[path].items():
                     if entity_info.get('type') == 'Function':
                         functions_info[entity_name] = entity_info
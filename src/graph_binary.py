@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+try:
+    from .graph_node import CNode
+except:
+    from graph_node import CNode
+
+
+# <pkg>.ccg layout, all integers little-endian uint32:
+#   header   magic, version, n_strings, n_modules, n_nodes, n_rels
+#   strings  n_strings + 1 offsets into the utf-8 blob
+#   modules  (name, first node, node count) per module
+#   nodes    NODE_FIELDS per node, string ids or NONE
+#   rels     (target, sub name, kind) per relation
+#   blob     utf-8 text of the interned strings
+MAGIC = b'CCGB'
+VERSION = 1
+HEADER = struct.Struct('<4s5I')
+NONE = 0xFFFFFFFF
+
+NODE_FIELDS = ('name', 'type', 'def', 'sline', 'in_struct', 'in_function', 'docstring', 'body',
+               'file_path', 'include', 'include_name', 'rels_start', 'rels_count', 'extra')
+NODE_WIDTH = len(NODE_FIELDS)
+STRING_KEYS = ('type', 'def', 'in_struct', 'in_function', 'docstring', 'body', 'file_path')
+GRAPH_SUFFIX = '.ccg'
+
+
+def _as_uint32(values):
+    ret = array('I', values)
+    if sys.byteorder != 'little':
+        ret.byteswap()
+    return ret
+
+
+def write_graph(proj_info, out_file):
+    strings = {}
+    def intern(text):
+        if text is None:
+            return NONE
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    modules = []
+    nodes = []
+    rels = []
+    for module, file_info in proj_info.items():
+        modules.extend([intern(module), len(nodes) // NODE_WIDTH, len(file_info)])
+
+        for name, node in file_info.items():
+            record = dict.fromkeys(NODE_FIELDS, NONE)
+            record['name'] = intern(name)
+            extra = {}
+
+            for key, value in node.items():
+                if key in STRING_KEYS and isinstance(value, str):
+                    record[key] = intern(value)
+                elif key == 'sline' and isinstance(value, int) and 0 <= value < NONE:
+                    record['sline'] = value
+                elif key == 'include' and isinstance(value, list) and len(value) == 2 \
+                        and isinstance(value[0], str) and (value[1] is None or isinstance(value[1], str)):
+                    record['include'] = intern(value[0])
+                    record['include_name'] = intern(value[1])
+                elif key == 'rels' and isinstance(value, list) \
+                        and all(isinstance(x, list) and len(x) == 3 for x in value):
+                    record['rels_start'] = len(rels) // 3
+                    record['rels_count'] = len(value)
+                    for target, sub_name, kind in value:
+                        rels.extend([intern(target), intern(sub_name), intern(kind)])
+                else:
+                    # anything the fixed record cannot hold is kept as json
+                    extra[key] = value
+
+            if extra:
+                record['extra'] = intern(json.dumps(extra))
+            nodes.extend(record[x] for x in NODE_FIELDS)
+
+    blob = bytearray()
+    offsets = [0]
+    for text in strings:
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+    if len(blob) >= NONE:
+        raise ValueError(f"Graph string table too large for {out_file}")
+
+    tmp_file = out_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(strings), len(modules) // 3, len(nodes) // NODE_WIDTH, len(rels) // 3))
+        for values in (offsets, modules, nodes, rels):
+            _as_uint32(values).tofile(f)
+        f.write(blob)
+    os.replace(tmp_file, out_file)
+
+
+class BinaryGraph(Mapping):
+    '''
+    Read-only {module: {name: node}} view of a .ccg file. The file is memory-mapped
+    and a module's nodes are only decoded into dicts the first time it is accessed,
+    keeping at most `max_modules` decoded modules (all of them when None).
+    '''
+    def __init__(self, graph_file, max_modules=None):
+        self.graph_file = graph_file
+        self.max_modules = max_modules
+        with open(graph_file, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_strings, n_modules, n_nodes, n_rels = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} graph file: {graph_file}")
+
+        pos = HEADER.size
+        def section(count):
+            nonlocal pos
+            view = memoryview(self._mm)[pos:pos + count * 4].cast('I')
+            pos += count * 4
+            return view
+
+        self._offsets = section(n_strings + 1)
+        self._modules = section(n_modules * 3)
+        self._nodes = section(n_nodes * NODE_WIDTH)
+        self._rels = section(n_rels * 3)
+        self._blob = memoryview(self._mm)[pos:]
+
+        self._module_index = {self.get_string(self._modules[i * 3]): i for i in range(n_modules)}
+        self._decoded = OrderedDict()
+        # text bytes of the decoded modules, for the memory accounting of CGenerator
+        self._module_bytes = {}
+        self.loaded_bytes = 0
+
+    def get_string(self, string_id):
+        if string_id == NONE:
+            return None
+        return str(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8')
+
+    def _decode_node(self, base):
+        fields = self._nodes[base:base + NODE_WIDTH]
+        node = {}
+        for i, key in enumerate(NODE_FIELDS):
+            value = fields[i]
+            if value == NONE or key in ('name', 'include_name', 'rels_start', 'extra'):
+                continue
+            if key == 'sline':
+                node['sline'] = value
+            elif key == 'include':
+                node['include'] = [self.get_string(value), self.get_string(fields[i + 1])]
+            elif key == 'rels_count':
+                start = fields[NODE_FIELDS.index('rels_start')] * 3
+                node['rels'] = [[self.get_string(x) for x in self._rels[j:j + 3]]
+                                for j in range(start, start + value * 3, 3)]
+            else:
+                node[key] = self.get_string(value)
+
+        extra = fields[NODE_FIELDS.index('extra')]
+        if extra != NONE:
+            node.update(json.loads(self.get_string(extra)))
+        return node
+
+    def _decode_module(self, index):
+        _, first, count = self._modules[index * 3:index * 3 + 3]
+        file_info = {}
+        for base in range(first * NODE_WIDTH, (first + count) * NODE_WIDTH, NODE_WIDTH):
+            file_info[sys.intern(self.get_string(self._nodes[base]))] = CNode(self._decode_node(base))
+        return file_info
+
+    def __getitem__(self, module):
+        file_info = self._decoded.get(module)
+        if file_info is not None:
+            self._decoded.move_to_end(module)
+            return file_info
+
+        file_info = self._decode_module(self._module_index[module])
+        self._decoded[module] = file_info
+        self._module_bytes[module] = sum(len(x) for node in file_info.values() for x in node.values() if isinstance(x, str))
+        self.loaded_bytes += self._module_bytes[module]
+        if self.max_modules is not None and len(self._decoded) > self.max_modules:
+            old_module, _ = self._decoded.popitem(last=False)
+            self.loaded_bytes -= self._module_bytes.pop(old_module)
+        return file_info
+
+    def __contains__(self, module):
+        return module in self._module_index
+
+    def __iter__(self):
+        return iter(self._module_index)
+
+    def __len__(self):
+        return len(self._module_index)
+
+    def close(self):
+        self._decoded.clear()
+        self._module_bytes.clear()
+        self.loaded_bytes = 0
+        for view in (self._offsets, self._modules, self._nodes, self._rels, self._blob):
+            view.release()
+        self._mm.close()
+
@@ -0,0 +1,116 @@
+import sys
+import json
+from collections.abc import Mapping
+
+
+# node key -> slot for the keys most nodes have ('def' is a keyword), the rarer ones
+# (rels, include, docstring, file_path, in_function) go to a per-node extra dict
+NODE_SLOTS = {'type': 'type', 'def': 'def_', 'sline': 'sline', 'in_struct': 'in_struct', 'body': 'body'}
+INTERN_KEYS = ('type', 'in_struct', 'in_function', 'file_path')
+
+
+def _intern(text):
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+class CNode(Mapping):
+    '''
+    Read-only node of a loaded graph with the same keys as the node dicts written by
+    preprocess.py. Fields live in slots, a missing key is an unset slot, and names,
+    types and paths are interned so they are shared across the whole graph.
+    '''
+    __slots__ = tuple(NODE_SLOTS.values()) + ('extra',)
+
+    def __init__(self, node):
+        extra = None
+        for key, value in node.items():
+            if key in INTERN_KEYS:
+                value = _intern(value)
+            elif key == 'rels' and isinstance(value, list):
+                value = tuple(tuple(_intern(x) for x in item) for item in value)
+            elif key == 'include' and isinstance(value, list):
+                # kept a list, callers check isinstance(include, list)
+                value = [_intern(x) for x in value]
+
+            slot = NODE_SLOTS.get(key)
+            if slot is not None:
+                object.__setattr__(self, slot, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[_intern(key)] = value
+        object.__setattr__(self, 'extra', extra)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CNode is read-only')
+
+    def __getitem__(self, key):
+        slot = NODE_SLOTS.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        slot = NODE_SLOTS.get(key)
+        if slot is not None:
+            return getattr(self, slot, default)
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        slot = NODE_SLOTS.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for key, slot in NODE_SLOTS.items():
+            if hasattr(self, slot):
+                yield key
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        node = dict(self.items())
+        if 'rels' in node:
+            node['rels'] = [list(x) for x in node['rels']]
+        return node
+
+    def __eq__(self, other):
+        if isinstance(other, CNode):
+            other = other.to_dict()
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == dict(other.items())
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'CNode({self.to_dict()!r})'
+
+
+def compact_file_info(file_info):
+    return {_intern(name): node if isinstance(node, CNode) else CNode(node) for name, node in file_info.items()}
+
+
+def compact_graph(proj_info):
+    # modules are converted one by one and dropped from the source, so the dict and
+    # slot copies of the graph are never both alive in full
+    ret = {}
+    for module in list(proj_info):
+        ret[_intern(module)] = compact_file_info(proj_info.pop(module))
+    return ret
+
+
+def load_json_graph(info_file):
+    with open(info_file, 'r') as f:
+        return compact_graph(json.load(f))
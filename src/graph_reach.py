@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+from array import array
+
+
+# <pkg>.reach: every node's reachable set up to max_hop
+#   line 1   {"version", "max_hop"}, read on its own to check whether a file is current
+#   line 2   {"modules": [path], "nodes": [[module id, name]]}
+#   offsets  2 * n_nodes + 1 uint32 (little-endian) into the blob, node i has its reachable
+#            ids at [off[2i], off[2i+1]) and its file edges at [off[2i+1], off[2i+2])
+#   blob     unsigned LEB128 varints: reachable ids as gaps between the sorted ids,
+#            file edges as (gap to the previous src module, dst module) sorted by src
+REACH_SUFFIX = '.reach'
+REACH_VERSION = 2
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varints(blob, start, end):
+    values = []
+    value = shift = 0
+    for pos in range(start, end):
+        byte = blob[pos]
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def read_reach_header(reach_file):
+    # the header of a current reach file, None when it is missing or of another version
+    try:
+        with open(reach_file, 'rb') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return header if header.get("version") == REACH_VERSION else None
+
+
+def write_reach(searcher, out_file, max_hop):
+    # searcher is a CProjectSearcher already set to the project graph. Unbounded sets are
+    # transitive closures, quadratic in the graph size, so only hop-bounded ones are stored
+    if max_hop is None:
+        raise ValueError("Reachable sets are only precomputed for a finite max_hop")
+
+    modules = list(searcher.proj_info)
+    module_ids = {x: i for i, x in enumerate(modules)}
+    nodes = []
+    node_ids = {}
+    for module_id, module in enumerate(modules):
+        for name in searcher.proj_info[module]:
+            node_ids[(module, name)] = len(nodes)
+            nodes.append([module_id, name])
+
+    offsets = array('I', [0])
+    blob = bytearray()
+    for module_id, name in nodes:
+        node_dict, file_edges = searcher.traverse([(modules[module_id], name)], max_hop)
+
+        prev = 0
+        for node_id in sorted(node_ids[(k, x)] for k, v in node_dict.items() for x in v):
+            _put_varint(blob, node_id - prev)
+            prev = node_id
+        offsets.append(len(blob))
+
+        # targets outside the graph are dropped
+        pairs = sorted((module_ids[src], module_ids[dst]) for src, targets in file_edges.items()
+                       for dst in targets if dst in module_ids)
+        prev = 0
+        for src, dst in pairs:
+            _put_varint(blob, src - prev)
+            _put_varint(blob, dst)
+            prev = src
+        offsets.append(len(blob))
+
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+
+    tmp_file = out_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(json.dumps({"version": REACH_VERSION, "max_hop": max_hop}).encode('utf-8') + b'\n')
+        f.write(json.dumps({"modules": modules, "nodes": nodes}, separators=(',', ':')).encode('utf-8') + b'\n')
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp_file, out_file)
+
+
+class ReachIndex(object):
+    '''
+    Precomputed reachable sets of a graph. get_prompt unions the sets of its seeds
+    instead of traversing, as long as it asks for the same max_hop. The sets stay
+    varint-encoded and are only decoded for the seeds asked for.
+    '''
+    def __init__(self, reach_file):
+        with open(reach_file, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get("version") != REACH_VERSION:
+                raise ValueError(f"Not a version {REACH_VERSION} reach file: {reach_file}")
+            names = json.loads(f.readline())
+            data = f.read()
+
+        self.max_hop = header["max_hop"]
+        self.modules = names["modules"]
+        self.nodes = names["nodes"]
+        self.node_ids = {(self.modules[m], name): i for i, (m, name) in enumerate(self.nodes)}
+
+        n_offsets = 2 * len(self.nodes) + 1
+        self._offsets = array('I')
+        self._offsets.frombytes(data[:n_offsets * 4])
+        if sys.byteorder != 'little':
+            self._offsets.byteswap()
+        self._blob = data[n_offsets * 4:]
+
+    def get_reachable(self, seeds):
+        node_ids = set()
+        pairs = set()
+        for seed in seeds:
+            node_id = self.node_ids.get(tuple(seed))
+            if node_id is None:
+                continue
+
+            start, mid, end = self._offsets[2 * node_id:2 * node_id + 3]
+            prev = 0
+            for gap in _read_varints(self._blob, start, mid):
+                prev += gap
+                node_ids.add(prev)
+
+            flat = _read_varints(self._blob, mid, end)
+            src = 0
+            for i in range(0, len(flat), 2):
+                src += flat[i]
+                pairs.add((src, flat[i + 1]))
+
+        node_dict = {}
+        for node_id in node_ids:
+            module_id, name = self.nodes[node_id]
+            node_dict.setdefault(self.modules[module_id], set()).add(name)
+
+        file_edges = {}
+        for src, dst in sorted(pairs):
+            file_edges.setdefault(self.modules[dst], [])
+            file_edges.setdefault(self.modules[src], []).append(self.modules[dst])
+
+        return node_dict, file_edges
@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+from collections import OrderedDict
+from collections.abc import Mapping
+
+try:
+    from .graph_node import compact_file_info
+    from .path_index import PathIndex
+except:
+    from graph_node import compact_file_info
+    from path_index import PathIndex
+
+
+# <pkg>.shards/ holds manifest.json and one <index>.json per module
+SHARDS_SUFFIX = '.shards'
+SHARDS_VERSION = 1
+
+
+def write_shards(proj_info, out_dir):
+    tmp_dir = out_dir + '.tmp'
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    modules = list(proj_info)
+    basenames = {}
+    for index, module in enumerate(modules):
+        file_info = proj_info[module]
+        with open(os.path.join(tmp_dir, f'{index}.json'), 'w') as f:
+            json.dump(file_info, f)
+
+        basenames.setdefault(os.path.basename(module), []).append(index)
+
+    manifest = {"version": SHARDS_VERSION, "modules": modules, "basenames": basenames}
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+
+
+class ShardedGraph(Mapping):
+    '''
+    {module: {name: node}} view of a <pkg>.shards directory. Only the manifest is read
+    up front; a module's shard is loaded on first access and kept in an LRU cache of
+    at most `max_shards` modules.
+    '''
+    def __init__(self, shard_dir, max_shards=256):
+        self.shard_dir = shard_dir
+        self.max_shards = max_shards
+        with open(os.path.join(shard_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SHARDS_VERSION:
+            raise ValueError(f"Not a version {SHARDS_VERSION} shard directory: {shard_dir}")
+
+        self.modules = manifest["modules"]
+        self.basenames = manifest["basenames"]
+        self._module_index = {x: i for i, x in enumerate(self.modules)}
+        self.path_index = PathIndex(self.modules)
+        self._cache = OrderedDict()
+        self.loads = 0
+        # json bytes of the cached shards, for the memory accounting of CGenerator
+        self._shard_bytes = {}
+        self.loaded_bytes = 0
+
+    def _load(self, index):
+        self.loads += 1
+        with open(os.path.join(self.shard_dir, f'{index}.json'), 'r') as f:
+            return compact_file_info(json.load(f))
+
+    def __getitem__(self, module):
+        file_info = self._cache.get(module)
+        if file_info is not None:
+            self._cache.move_to_end(module)
+            return file_info
+
+        index = self._module_index[module]
+        file_info = self._load(index)
+        self._cache[module] = file_info
+        self._shard_bytes[module] = os.path.getsize(os.path.join(self.shard_dir, f'{index}.json'))
+        self.loaded_bytes += self._shard_bytes[module]
+        if len(self._cache) > self.max_shards:
+            old_module, _ = self._cache.popitem(last=False)
+            self.loaded_bytes -= self._shard_bytes.pop(old_module)
+        return file_info
+
+    def __contains__(self, module):
+        return module in self._module_index
+
+    def __iter__(self):
+        return iter(self.modules)
+
+    def __len__(self):
+        return len(self.modules)
+
+    def get_nodes(self, module, node_type=None):
+        if module not in self._module_index:
+            return {}
+        return {k: v for k, v in self[module].items() if node_type is None or v.get('type') == node_type}
+
+    def modules_by_basename(self, basename):
+        return [self.modules[x] for x in self.basenames.get(basename, [])]
+
+    def modules_by_suffix(self, path_suffix):
+        return self.path_index.find_suffix(path_suffix)
+
+    def modules_with_def(self, text, node_type='Variable'):
+        # reads every shard once without filling the cache, a full scan must not evict the working set
+        ret = []
+        for index, module in enumerate(self.modules):
+            file_info = self._cache.get(module)
+            if file_info is None:
+                file_info = self._load(index)
+            if any(x.get('type') == node_type and x.get('def', '').find(text) >= 0 for x in file_info.values()):
+                ret.append(module)
+        return ret
+
+    def close(self):
+        self._cache.clear()
+        self._shard_bytes.clear()
+        self.loaded_bytes = 0
+
@@ -0,0 +1,163 @@
+import os
+import json
+import sqlite3
+from collections.abc import Mapping
+
+
+GRAPH_DB_SUFFIX = '.db'
+
+SCHEMA = '''
+CREATE TABLE modules (id INTEGER PRIMARY KEY, path TEXT NOT NULL, basename TEXT NOT NULL, rpath TEXT NOT NULL);
+CREATE TABLE nodes (
+    id INTEGER PRIMARY KEY, module_id INTEGER NOT NULL, name TEXT NOT NULL,
+    type TEXT, def TEXT, sline INTEGER, in_struct TEXT, in_function TEXT, docstring TEXT, body TEXT,
+    file_path TEXT, include_path TEXT, include_name TEXT, extra TEXT
+);
+CREATE TABLE edges (node_id INTEGER NOT NULL, target TEXT, sub_name TEXT, kind TEXT);
+CREATE UNIQUE INDEX modules_path ON modules(path);
+CREATE INDEX modules_basename ON modules(basename);
+CREATE INDEX modules_rpath ON modules(rpath);
+CREATE INDEX nodes_module_name ON nodes(module_id, name);
+CREATE INDEX nodes_name ON nodes(name);
+CREATE INDEX edges_node ON edges(node_id);
+'''
+
+COLUMN_KEYS = ('type', 'def', 'sline', 'in_struct', 'in_function', 'docstring', 'body', 'file_path')
+NODE_COLUMNS = 'n.id, n.name, ' + ', '.join(f'n.{x}' for x in COLUMN_KEYS) + ', n.include_path, n.include_name, n.extra'
+
+
+def write_sqlite(proj_info, db_file):
+    tmp_file = db_file + '.tmp'
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+
+    conn = sqlite3.connect(tmp_file)
+    conn.executescript(SCHEMA)
+    node_id = 0
+    for module_id, (module, file_info) in enumerate(proj_info.items()):
+        conn.execute('INSERT INTO modules VALUES (?, ?, ?, ?)', (module_id, module, os.path.basename(module), module[::-1]))
+
+        node_rows = []
+        edge_rows = []
+        for name, node in file_info.items():
+            row = {x: node.get(x) for x in COLUMN_KEYS}
+            extra = {k: v for k, v in node.items() if k not in COLUMN_KEYS and k not in ('include', 'rels')}
+
+            include = node.get('include')
+            if isinstance(include, list) and len(include) == 2:
+                row['include_path'], row['include_name'] = include
+            elif include is not None:
+                extra['include'] = include
+
+            rels = node.get('rels')
+            if isinstance(rels, list) and all(isinstance(x, list) and len(x) == 3 for x in rels):
+                edge_rows.extend((node_id, *x) for x in rels)
+            elif rels is not None:
+                extra['rels'] = rels
+
+            node_rows.append((node_id, module_id, name, *(row[x] for x in COLUMN_KEYS),
+                              row.get('include_path'), row.get('include_name'), json.dumps(extra) if extra else None))
+            node_id += 1
+
+        conn.executemany(f'INSERT INTO nodes VALUES ({", ".join("?" * 14)})', node_rows)
+        conn.executemany('INSERT INTO edges VALUES (?, ?, ?, ?)', edge_rows)
+
+    conn.commit()
+    conn.close()
+    os.replace(tmp_file, db_file)
+
+
+class SQLiteGraph(Mapping):
+    '''
+    {module: {name: node}} view of a graph stored in sqlite. Besides the mapping
+    interface it answers the lookups of CGenerator and CProjectSearcher with indexed
+    queries, so a request only reads the rows it needs.
+    '''
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+        self._module_ids = dict((path, module_id) for module_id, path in
+                                self.conn.execute('SELECT id, path FROM modules ORDER BY id'))
+
+    def _to_node(self, row, rels):
+        node = {k: v for k, v in zip(COLUMN_KEYS, row[2:]) if v is not None}
+
+        include_path, include_name, extra = row[-3:]
+        if include_path is not None:
+            node['include'] = [include_path, include_name]
+
+        if rels:
+            node['rels'] = rels
+
+        if extra is not None:
+            node.update(json.loads(extra))
+        return row[1], node
+
+    def get_node(self, module, name):
+        module_id = self._module_ids.get(module)
+        if module_id is None:
+            return None
+        row = self.conn.execute(f'SELECT {NODE_COLUMNS} FROM nodes n WHERE n.module_id = ? AND n.name = ? ORDER BY n.id DESC LIMIT 1',
+                                (module_id, name)).fetchone()
+        if row is None:
+            return None
+        rels = [list(x) for x in self.conn.execute(
+            'SELECT target, sub_name, kind FROM edges WHERE node_id = ? ORDER BY rowid', (row[0],))]
+        return self._to_node(row, rels)[1]
+
+    def has_name(self, module, name):
+        module_id = self._module_ids.get(module)
+        if module_id is None:
+            return False
+        return self.conn.execute('SELECT 1 FROM nodes WHERE module_id = ? AND name = ? LIMIT 1', (module_id, name)).fetchone() is not None
+
+    def get_nodes(self, module, node_type=None):
+        module_id = self._module_ids.get(module)
+        if module_id is None:
+            return {}
+        where, params = 'n.module_id = ?', (module_id,)
+        if node_type is not None:
+            where, params = 'n.module_id = ? AND n.type = ?', (module_id, node_type)
+
+        # edges of the whole module in one query instead of one per node
+        rels = {}
+        for node_id, *rel in self.conn.execute(f'SELECT e.node_id, e.target, e.sub_name, e.kind FROM edges e '
+                                               f'JOIN nodes n ON n.id = e.node_id WHERE {where} ORDER BY e.rowid', params):
+            rels.setdefault(node_id, []).append(rel)
+
+        rows = self.conn.execute(f'SELECT {NODE_COLUMNS} FROM nodes n WHERE {where} ORDER BY n.id', params)
+        return dict(self._to_node(x, rels.get(x[0])) for x in rows)
+
+    def modules_by_basename(self, basename):
+        # module paths with this file name, in graph order
+        return [x[0] for x in self.conn.execute('SELECT path FROM modules WHERE basename = ? ORDER BY id', (basename,))]
+
+    def modules_by_suffix(self, path_suffix):
+        # paths ending with path_suffix are a prefix range of the reversed paths
+        rsuffix = path_suffix[::-1]
+        return [x[0] for x in self.conn.execute('SELECT path FROM modules WHERE rpath >= ? AND rpath < ? ORDER BY id',
+                                                (rsuffix, rsuffix + '\U0010ffff'))]
+
+    def modules_with_def(self, text, node_type='Variable'):
+        return [x[0] for x in self.conn.execute(
+            'SELECT m.path FROM modules m WHERE EXISTS '
+            '(SELECT 1 FROM nodes n WHERE n.module_id = m.id AND n.type = ? AND instr(n.def, ?) > 0) ORDER BY m.id',
+            (node_type, text))]
+
+    def __getitem__(self, module):
+        if module not in self._module_ids:
+            raise KeyError(module)
+        return self.get_nodes(module)
+
+    def __contains__(self, module):
+        return module in self._module_ids
+
+    def __iter__(self):
+        return iter(self._module_ids)
+
+    def __len__(self):
+        return len(self._module_ids)
+
+    def close(self):
+        self.conn.close()
+
@@ -0,0 +1,91 @@
+import os
+import json
+import shutil
+import time
+
+try:
+    from .graph_binary import write_graph, BinaryGraph, GRAPH_SUFFIX
+    from .graph_sqlite import write_sqlite, SQLiteGraph, GRAPH_DB_SUFFIX
+    from .graph_shards import write_shards, ShardedGraph, SHARDS_SUFFIX
+    from .graph_node import load_json_graph
+except:
+    from graph_binary import write_graph, BinaryGraph, GRAPH_SUFFIX
+    from graph_sqlite import write_sqlite, SQLiteGraph, GRAPH_DB_SUFFIX
+    from graph_shards import write_shards, ShardedGraph, SHARDS_SUFFIX
+    from graph_node import load_json_graph
+
+
+# stored graph formats written next to <pkg>.json, in the order CGenerator prefers them:
+#   sqlite  <pkg>.db       indexed queries, nothing is loaded up front
+#   shards  <pkg>.shards/  one json file per module, loaded on first access
+#   binary  <pkg>.ccg      memory-mapped, a module is decoded on first access
+# the json graph itself is the fallback when none of them exists
+GRAPH_FORMATS = {
+    "sqlite": {"suffix": GRAPH_DB_SUFFIX, "write": write_sqlite, "load": lambda path, max_modules: SQLiteGraph(path)},
+    "shards": {"suffix": SHARDS_SUFFIX, "write": write_shards, "load": ShardedGraph},
+    "binary": {"suffix": GRAPH_SUFFIX, "write": write_graph, "load": BinaryGraph},
+}
+
+
+def get_graph_path(graph_dir, project, fmt):
+    return os.path.join(graph_dir, f'{project}{GRAPH_FORMATS[fmt]["suffix"]}')
+
+
+def remove_graph(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.isfile(path):
+        os.remove(path)
+
+
+def sync_graphs(proj_info, graph_dir, project, formats, rebuilt):
+    # CGenerator prefers the stored formats over the json graph, so a requested one is rewritten
+    # with every rebuild and one that is no longer requested is removed. Returns {fmt: seconds}
+    dump_times = {}
+    for fmt in GRAPH_FORMATS:
+        path = get_graph_path(graph_dir, project, fmt)
+        if fmt in formats and (rebuilt or not os.path.exists(path)):
+            dump_start = time.perf_counter()
+            GRAPH_FORMATS[fmt]["write"](proj_info, path)
+            dump_times[fmt] = time.perf_counter() - dump_start
+        elif fmt not in formats and rebuilt:
+            remove_graph(path)
+
+    return dump_times
+
+
+def load_graph(graph_dir, project, max_modules=256):
+    # (graph, format) of the preferred format present, (None, None) for an unknown project.
+    # max_modules bounds the decoded modules the shards and binary formats keep
+    for fmt, graph_format in GRAPH_FORMATS.items():
+        path = get_graph_path(graph_dir, project, fmt)
+        if os.path.exists(path):
+            return graph_format["load"](path, max_modules), fmt
+
+    info_file = os.path.join(graph_dir, f'{project}.json')
+    if os.path.isfile(info_file):
+        return load_json_graph(info_file), "json"
+    return None, None
+
+
+def convert_json_graph(json_file, fmt, out_path=None):
+    if out_path is None:
+        out_path = os.path.splitext(json_file)[0] + GRAPH_FORMATS[fmt]["suffix"]
+    with open(json_file, 'r') as f:
+        proj_info = json.load(f)
+    GRAPH_FORMATS[fmt]["write"](proj_info, out_path)
+    return out_path
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('json_files', nargs='+', help='c_graph/<pkg>.json files to convert, the stored graph is written next to each')
+    parser.add_argument('-f', '--format', choices=list(GRAPH_FORMATS), action='append', required=True,
+                        help='stored format to write, may be given several times')
+    args = parser.parse_args()
+
+    for json_file in args.json_files:
+        for fmt in args.format:
+            print(f'{json_file} -> {convert_json_graph(json_file, fmt)}')
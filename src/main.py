@@ -3,7 +3,7 @@ import json
 import time 
 import signal 
 from generator import CGenerator
-from utils import DS_REPO_DIR, DS_FILE, DS_GRAPH_DIR, PT_FILE, MODEL
+from utils import DS_REPO_DIR, DS_FILE, DS_GRAPH_DIR, PT_FILE, MODEL, GRAPH_CACHE_MB
 from argparse import ArgumentParser
 
 
@@ -20,13 +20,15 @@ if __name__ == '__main__':
     parser.add_argument('-c', '--c_dataset', default=None, help='C语言数据集文件路径，不指定则使用默认路径')
     parser.add_argument('-t', '--timeout', type=int, default=30, help='单个样本处理超时时间（秒）')
     parser.add_argument('-b', '--batch_size', type=int, default=100, help='批处理大小，每处理这么多样本保存一次结果')
+    parser.add_argument('-g', '--group', action='store_true', help='按项目和文件分组处理样本以减少项目图切换，结果仍按原始顺序写出')
+    parser.add_argument('--graph_cache_mb', type=float, default=GRAPH_CACHE_MB, help='已加载项目图缓存的内存上限（MB），超出时淘汰最久未使用的项目')
     args = parser.parse_args()
     print(f'使用模型: {args.model}')
     print(f'输出提示文件: {args.file}')
     print(f'C语言数据集文件: {args.c_dataset}')
     print(f'单个样本处理超时时间: {args.timeout}秒')
     print(f'批处理大小: {args.batch_size}')
-    generator = CGenerator(DS_REPO_DIR, DS_GRAPH_DIR, args.model.lower())
+    generator = CGenerator(DS_REPO_DIR, DS_GRAPH_DIR, args.model.lower(), cache_bytes=int(args.graph_cache_mb * 2**20))
 
     dataset_file = args.c_dataset if args.c_dataset else DS_FILE
     with open(dataset_file, 'r') as f:
@@ -41,22 +43,48 @@ if __name__ == '__main__':
                 start_idx = processed
                 print(f'检测到{args.file}已处理 {processed} 个样本，从第 {start_idx+1} 个样本继续处理')
                 
+    order = list(range(start_idx, len(dataset)))
+    if args.group:
+        # projects in order of first appearance, files sorted inside a project
+        pkg_rank = {}
+        for i in order:
+            pkg_rank.setdefault(dataset[i]['pkg'], len(pkg_rank))
+        order.sort(key=lambda i: (pkg_rank[dataset[i]['pkg']], dataset[i]['fpath'], i))
+    
+    # results are written in dataset order, only the finished prefix is flushed
+    results = {}  # {index: result or None}
+    next_idx = start_idx
+    pkg_switches = 0
+    last_pkg = None
+    
     ret = []
     timeout_samples = []  
     
     signal.signal(signal.SIGALRM, timeout_handler)
     
-    for i, item in enumerate(dataset[start_idx:], start=start_idx):
-        if i % 10 == 0:
-            print(f'正在处理第 {i}/{len(dataset)} 个样本...')
+    for n, i in enumerate(order):
+        item = dataset[i]
+        if n % 10 == 0:
+            print(f'正在处理第 {start_idx + n}/{len(dataset)} 个样本...')
+            
+        if n > 0 and n % args.batch_size == 0:
+            while next_idx in results:
+                result_item = results.pop(next_idx)
+                if result_item is not None:
+                    ret.append(result_item)
+                next_idx += 1
             
-        if i > start_idx and (i - start_idx) % args.batch_size == 0:
-            print(f'正在保存批处理结果... 已完成 {i} 个样本')
+            print(f'正在保存批处理结果... 已完成 {start_idx + n} 个样本')
             with open(args.file, 'a', encoding="utf-8") as f:
                 for result_item in ret:
                     json.dump(result_item, f, ensure_ascii=False)
                     f.write('\n')
             ret = []  
+        
+        if item['pkg'] != last_pkg:
+            pkg_switches += last_pkg is not None
+            last_pkg = item['pkg']
+        results[i] = None
             
         fpath = os.path.join(DS_REPO_DIR, item['fpath'])
         try:
@@ -76,7 +104,7 @@ if __name__ == '__main__':
                     "id": item.get('id', i+1),  
                     "prompt": prompt_text
                 }
-                ret.append(result)
+                results[i] = result
             else:
                 print(f'跳过非C语言文件: {fpath}')
         except TimeoutException:
@@ -90,20 +118,29 @@ if __name__ == '__main__':
             signal.alarm(0)
             continue
 
-    print(f'成功为 {len(ret) + (i - start_idx + 1 - len(ret) - len(timeout_samples))} 个样本生成提示')
+    for i in range(next_idx, len(dataset)):
+        if results.get(i) is not None:
+            ret.append(results[i])
+    
+    print(f'成功为 {len(order) - len(timeout_samples)} 个样本生成提示')
     print(f'跳过了 {len(timeout_samples)} 个超时样本')
+    print(f'项目切换次数: {pkg_switches}')
+    
+    cache_stats = generator.get_cache_stats()
+    print(f'项目图缓存命中率: {cache_stats["hit_rate"]:.2%} (命中 {cache_stats["hits"]}, 未命中 {cache_stats["misses"]}, '
+          f'淘汰 {cache_stats["evictions"]}, 缓存 {cache_stats["projects"]} 个项目 {cache_stats["bytes"] / 2**20:.1f} MB)')
     
     if ret:
         with open(args.file, 'a', encoding="utf-8") as f:
             for item in ret:
-                json.dump(item, f)
+                json.dump(item, f, ensure_ascii=False)
                 f.write('\n')
     
     if timeout_samples:
         timeout_file = args.file + '.timeout'
-        with open(timeout_file, 'w') as f:
+        with open(timeout_file, 'w', encoding="utf-8") as f:
             for item in timeout_samples:
-                json.dump(item, f)
+                json.dump(item, f, ensure_ascii=False)
                 f.write('\n')
         print(f'超时样本信息已保存到 {timeout_file}')
     
@@ -1,12 +1,47 @@
 import os
 import json
+import heapq
 from itertools import groupby
+from collections import OrderedDict
+
+try:
+    from .graph_sqlite import SQLiteGraph
+    from .graph_node import compact_graph
+    from .graph_store import load_graph
+    from .graph_reach import ReachIndex, read_reach_header, REACH_SUFFIX
+    from .path_index import PathIndex
+    from .utils import FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_MB, REACH_CACHE_SIZE, REACH_CACHE_NODES
+except:
+    from graph_sqlite import SQLiteGraph
+    from graph_node import compact_graph
+    from graph_store import load_graph
+    from graph_reach import ReachIndex, read_reach_header, REACH_SUFFIX
+    from path_index import PathIndex
+    from utils import FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_MB, REACH_CACHE_SIZE, REACH_CACHE_NODES
 
 
 class CProjectSearcher(object):
-    def __init__(self):
+    def __init__(self, fragment_cache_size=FRAGMENT_CACHE_SIZE, fragment_cache_bytes=FRAGMENT_CACHE_MB * 2**20, 
+                 reach_cache_size=REACH_CACHE_SIZE, reach_cache_nodes=REACH_CACHE_NODES):
         self.proj_dir = None
         self.proj_info = None
+        self.path_index = None
+        self.reach_index = None
+        
+        # {(fpath, name, max_hop): (node_dict, file_edges, nodes)}, least recently used first
+        self.reach_cache_size = reach_cache_size
+        self.reach_cache_nodes = reach_cache_nodes
+        self.reach_cache = OrderedDict()
+        self.reach_used = 0
+        self.reach_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.render_index = {}  # {fpath: module index from _get_module_index}
+        
+        # {(fpath, frozenset(names), only_def, enable_docstring): rendered prompt}, least recently used first
+        self.fragment_cache_size = fragment_cache_size
+        self.fragment_cache_bytes = fragment_cache_bytes
+        self.fragment_cache = OrderedDict()
+        self.fragment_used = 0
+        self.fragment_stats = {"hits": 0, "misses": 0, "evictions": 0}
 
         self.standard_libraries = {
             "stdio", "stdlib", "string", "math", "time", "ctype", "assert", 
@@ -14,11 +49,24 @@ class CProjectSearcher(object):
             "signal", "locale", "setjmp", "wchar", "wctype"
         }
     
-    def set_proj(self, proj_dir, proj_info):
+    def set_proj(self, proj_dir, proj_info, compact=True):
         if not proj_dir.endswith(os.sep):
             self.proj_dir = proj_dir + os.sep
         else:
             self.proj_dir = proj_dir
+        
+        self.reach_cache = OrderedDict()
+        self.reach_used = 0
+        self.reach_index = None
+        self.render_index = {}
+        self.fragment_cache = OrderedDict()
+        self.fragment_used = 0
+        
+        # stored graphs (sqlite, shards, binary) were normalized before they were written
+        if not isinstance(proj_info, dict):
+            self.proj_info = proj_info
+            self.path_index = None if isinstance(proj_info, SQLiteGraph) else PathIndex(proj_info, self.proj_dir)
+            return
             
         normalized_info = {}
         for module, file_info in proj_info.items():
@@ -28,7 +76,12 @@ class CProjectSearcher(object):
                 
             normalized_info[module] = file_info
         
+        # searches only read the graph, so nodes become slotted records unless the caller
+        # still rewrites them in place as preprocess.py does (compact=False)
+        if compact:
+            normalized_info = compact_graph(normalized_info)
         self.proj_info = normalized_info
+        self.path_index = PathIndex(normalized_info, self.proj_dir)
     
     def name_in_file(self, name, avail_list, src_name=None, struct_name=None):
         if name.count('.') > 0 and struct_name:
@@ -46,6 +99,31 @@ class CProjectSearcher(object):
         
         return None
     
+    def _get_node(self, fpath, name):
+        if isinstance(self.proj_info, SQLiteGraph):
+            return self.proj_info.get_node(fpath, name)
+        return self.proj_info.get(fpath, {}).get(name)
+    
+    def find_name(self, fpath, name, src_name=None, struct_name=None):
+        # name_in_file over the names of module fpath, but only looks up name and its dotted prefixes
+        if name.count('.') > 0 and struct_name:
+            parts = name.split('.')
+            if parts[0] == struct_name:
+                return struct_name, parts[1]
+        
+        if isinstance(self.proj_info, SQLiteGraph):
+            has_name = lambda x: self.proj_info.has_name(fpath, x)
+        else:
+            has_name = self.proj_info.get(fpath, {}).__contains__
+        
+        parts = name.split('.')
+        for i in range(len(parts), 0, -1):
+            item = '.'.join(parts[:i])
+            if (src_name is None or item != src_name) and has_name(item):
+                return item, '.'.join(parts[i:]) if i < len(parts) else None
+        
+        return None
+    
     def is_local_include(self, file_path, include_info):
         if isinstance(include_info, list) and len(include_info) > 0:
             header_name = include_info[0]
@@ -56,13 +134,11 @@ class CProjectSearcher(object):
         if header_base in self.standard_libraries:
             return None
         
-        candidates = []
-        for path in self.proj_info:
-            if path.endswith(header_name) or path.endswith(os.path.join('include', header_name)):
-                candidates.append(path)
-        
-        if not candidates:
-            candidates = [x for x in self.proj_info if os.path.basename(x) == header_name]
+        # every path ending with include/<header> also ends with <header>
+        if isinstance(self.proj_info, SQLiteGraph):
+            candidates = self.proj_info.modules_by_suffix(header_name) or self.proj_info.modules_by_basename(header_name)
+        else:
+            candidates = self.path_index.find_suffix(header_name) or self.path_index.find_basename(header_name)
         
         if candidates:
             if len(candidates) > 1:
@@ -73,6 +149,9 @@ class CProjectSearcher(object):
         return None
     
     def get_distance_paths(self, src_path, target_path):
+        if self.path_index is not None:
+            return self.path_index.get_distance(src_path, target_path)
+        
         src_parts = src_path.replace(self.proj_dir, '').split(os.sep)
         target_parts = target_path.replace(self.proj_dir, '').split(os.sep)
         
@@ -96,7 +175,37 @@ class CProjectSearcher(object):
         
         return ''
     
-    def _get_file_prompt(self, file_info, name_set, only_def=True, enable_docstring=True):
+    def _group_by_line(self, file_info, names):
+        return [(sline, list(group)) for sline, group in groupby(names, key=lambda x: file_info[x].get('sline', -1))]
+    
+    def _get_module_index(self, fpath, file_info):
+        # built on the first render of a module and kept until the next set_proj
+        if fpath not in self.render_index:
+            self.render_index[fpath] = self._build_module_index(file_info)
+        return self.render_index[fpath]
+    
+    def _build_module_index(self, file_info):
+        # rank:    {name: position in line order}, ties keep the graph order
+        # members: {struct: [(sline, [member])]}
+        # globals: [(sline, [name])] of the top level names
+        names = sorted(file_info, key=lambda x: file_info[x].get('sline', -1))
+        members = {}
+        global_names = []
+        for name in names:
+            node_info = file_info[name]
+            struct_name = node_info.get('in_struct', None)
+            if struct_name is not None:
+                members.setdefault(struct_name, []).append(name)
+            if name and not struct_name and not node_info.get('in_function', False):
+                global_names.append(name)
+        
+        return {
+            'rank': {x: i for i, x in enumerate(names)},
+            'members': {k: self._group_by_line(file_info, v) for k, v in members.items()},
+            'globals': self._group_by_line(file_info, global_names),
+        }
+    
+    def _get_file_prompt(self, file_info, name_set, only_def=True, enable_docstring=True, index=None):
 
         prompt_list = []
 
@@ -111,14 +220,10 @@ class CProjectSearcher(object):
             if doc:
                 prompt_list.append(doc)
         
-        global_names = [k for k, v in file_info.items() 
-                       if k and not v.get('in_struct', False) and not v.get('in_function', False)]
+        if index is None:
+            index = self._build_module_index(file_info)
         
-        global_names.sort(key=lambda x: file_info[x].get('sline', -1))
-        
-        for sline, name_list in groupby(global_names, key=lambda x: file_info[x].get('sline', -1)):
-            name_list = list(name_list)
-            
+        for sline, name_list in index['globals']:
             if sline == -1:
                 includes = []
                 for name in name_list:
@@ -159,11 +264,11 @@ class CProjectSearcher(object):
             
             elif name_type == 'Struct':
                 tmp_set = name_set | {name}
-                prompt_list.append(self._get_struct_prompt(file_info, name, {}, tmp_set, only_def, enable_docstring))
+                prompt_list.append(self._get_struct_prompt(file_info, name, {}, tmp_set, only_def, enable_docstring, index))
             
             elif name_type == 'Union':
                 tmp_set = name_set | {name}
-                prompt_list.append(self._get_union_prompt(file_info, name, {}, tmp_set, only_def, enable_docstring))
+                prompt_list.append(self._get_union_prompt(file_info, name, {}, tmp_set, only_def, enable_docstring, index))
             
             elif name_type == 'Enum':
                 prompt_list.append(self._get_enum_prompt(name_info, only_def, enable_docstring))
@@ -171,7 +276,7 @@ class CProjectSearcher(object):
         prompt_list = [x.rstrip() for x in prompt_list]
         return '\n'.join(prompt_list)
     
-    def _get_struct_prompt(self, file_info, struct_name, struct_dict, name_set, only_def=True, enable_docstring=True):
+    def _get_struct_prompt(self, file_info, struct_name, struct_dict, name_set, only_def=True, enable_docstring=True, index=None):
         def_content = file_info[struct_name]['def']
         struct_indent = self._get_indent(def_content)
         
@@ -180,15 +285,12 @@ class CProjectSearcher(object):
         if enable_docstring and 'docstring' in file_info[struct_name]:
             prompt_list.append(file_info[struct_name]['docstring'])
         
+        if index is None:
+            index = self._build_module_index(file_info)
+        member_lines = index['members'].get(struct_name, [])
+        
         if struct_name in name_set:
-            member_names = [k for k, v in file_info.items() 
-                           if v.get('in_struct', None) == struct_name]
-            
-            member_names.sort(key=lambda x: file_info[x]['sline'])
-            
-            for sline, members in groupby(member_names, key=lambda x: file_info[x]['sline']):
-                members = list(members)
-                
+            for sline, members in member_lines:
                 if file_info[members[0]]['type'] == 'Variable':
                     if any(x in name_set for x in members):
                         prompt_list.append(self._get_variable_prompt(file_info, members, False))
@@ -199,15 +301,16 @@ class CProjectSearcher(object):
                     inner_name = members[0]
                     prompt_list.append(self._get_struct_prompt(
                         file_info, inner_name, struct_dict, name_set | {inner_name}, 
-                        only_def, enable_docstring
+                        only_def, enable_docstring, index
                     ))
         
         else:
-            member_names = struct_dict.get(struct_name, [])
-            member_names.sort(key=lambda x: file_info[x]['sline'])
-            
-            for sline, members in groupby(member_names, key=lambda x: file_info[x]['sline']):
-                members = list(members)
+            # only the members that were asked for, in line order
+            selected = struct_dict.get(struct_name, ())
+            for sline, members in member_lines:
+                members = [x for x in members if x in selected]
+                if not members:
+                    continue
                 
                 if file_info[members[0]]['type'] == 'Variable':
                     if any(x in name_set for x in members):
@@ -219,14 +322,14 @@ class CProjectSearcher(object):
                     inner_name = members[0]
                     prompt_list.append(self._get_struct_prompt(
                         file_info, inner_name, struct_dict, name_set,
-                        only_def, enable_docstring
+                        only_def, enable_docstring, index
                     ))
         
         prompt_list = [x.rstrip() for x in prompt_list]
         return f'\n{struct_indent}'.join(prompt_list)
     
-    def _get_union_prompt(self, file_info, union_name, union_dict, name_set, only_def=True, enable_docstring=True):
-        return self._get_struct_prompt(file_info, union_name, union_dict, name_set, only_def, enable_docstring)
+    def _get_union_prompt(self, file_info, union_name, union_dict, name_set, only_def=True, enable_docstring=True, index=None):
+        return self._get_struct_prompt(file_info, union_name, union_dict, name_set, only_def, enable_docstring, index)
     
     def _get_enum_prompt(self, node_info, only_def=True, enable_docstring=True):
         prompt = node_info['def']
@@ -276,14 +379,46 @@ class CProjectSearcher(object):
         return f"/* {fpath} */\n"
     
     def get_prompt4names(self, fpath, name_set, only_def=True, enable_docstring=True):
+        # while the project is set a fragment depends only on these arguments
+        key = (fpath, frozenset(name_set), only_def, enable_docstring)
+        prompt = self.fragment_cache.get(key)
+        if prompt is not None:
+            self.fragment_cache.move_to_end(key)
+            self.fragment_stats["hits"] += 1
+            return prompt
+        
+        self.fragment_stats["misses"] += 1
+        prompt = self._render_names(fpath, name_set, only_def, enable_docstring)
+        if prompt is None or len(prompt) > self.fragment_cache_bytes or self.fragment_cache_size <= 0:
+            return prompt
+        
+        self.fragment_cache[key] = prompt
+        self.fragment_used += len(prompt)
+        while len(self.fragment_cache) > self.fragment_cache_size or self.fragment_used > self.fragment_cache_bytes:
+            _, old_prompt = self.fragment_cache.popitem(last=False)
+            self.fragment_used -= len(old_prompt)
+            self.fragment_stats["evictions"] += 1
+        return prompt
+    
+    def get_fragment_stats(self):
+        total = self.fragment_stats["hits"] + self.fragment_stats["misses"]
+        stats = dict(self.fragment_stats)
+        stats["hit_rate"] = self.fragment_stats["hits"] / total if total else 0.0
+        stats["fragments"] = len(self.fragment_cache)
+        stats["bytes"] = self.fragment_used
+        return stats
+    
+    def _render_names(self, fpath, name_set, only_def=True, enable_docstring=True):
         file_info = self.proj_info.get(fpath, None)
         if file_info is None:
             return None
         
         path_comment = self.get_path_comment(fpath)
         
+        index = self._get_module_index(fpath, file_info)
+        
         if '' in name_set or None in name_set:
-            return path_comment + self._get_file_prompt(file_info, name_set, only_def, enable_docstring)
+            return path_comment + self._get_file_prompt(file_info, name_set, only_def, enable_docstring, index)
         
         struct_dict = {}
         global_names = set()
@@ -306,11 +441,10 @@ class CProjectSearcher(object):
         
         prompt_list = []
         
-        global_names = sorted(global_names, key=lambda x: file_info[x].get('sline', -1))
+        # line order of the module, names sharing a line stay in graph order
+        global_names = sorted(global_names, key=index['rank'].__getitem__)
         
-        for sline, names in groupby(global_names, key=lambda x: file_info[x].get('sline', -1)):
-            names = list(names)
-            
+        for sline, names in self._group_by_line(file_info, global_names):
             if sline == -1:
                 includes = []
                 for name in names:
@@ -344,13 +478,13 @@ class CProjectSearcher(object):
             elif name_type == 'Struct':
                 prompt_list.append(self._get_struct_prompt(
                     file_info, name, struct_dict, name_set, 
-                    only_def, enable_docstring
+                    only_def, enable_docstring, index
                 ))
             
             elif name_type == 'Union':
                 prompt_list.append(self._get_union_prompt(
                     file_info, name, struct_dict, name_set,
-                    only_def, enable_docstring
+                    only_def, enable_docstring, index
                 ))
             
             elif name_type == 'Enum':
@@ -360,86 +494,83 @@ class CProjectSearcher(object):
         return path_comment + '\n'.join(prompt_list)
     
     def pseudo_topo_sort(self, fpath_set, file_edges, fpath_order):
-        in_table = {}  
-        out_table = {} 
-        
+        # Kahn ordering on a heap: each step takes the file with the fewest in-edges left, so cycles
+        # still make progress. Ties go to files outside fpath_order by name, then by position in it
+        order_index = {}
+        for i, item in enumerate(fpath_order):
+            order_index.setdefault(item, i)
+        
+        def sort_key(item):
+            if item in order_index:
+                return (1, order_index[item], '')
+            return (0, 0, item)
+        
+        in_degree = dict.fromkeys(fpath_set, 0)
+        out_table = {}
         for item in fpath_set:
-            if item not in in_table:
-                in_table[item] = []
-            if item not in out_table:
-                out_table[item] = []
-            
-            for x in file_edges.get(item, []):
-                if x not in fpath_set:
-                    continue
-                
-                out_table[item].append(x)
-                if x not in in_table:
-                    in_table[x] = [item]
-                else:
-                    in_table[x].append(item)
+            out_table[item] = [x for x in file_edges.get(item, []) if x in fpath_set]
+            for x in out_table[item]:
+                in_degree[x] += 1
+        
+        heap = [(degree, sort_key(item), item) for item, degree in in_degree.items()]
+        heapq.heapify(heap)
         
         sort_list = []
-        while in_table:
-            node_list = list(in_table)
-            
-            min_index = 0
-            min_degree = len(in_table[node_list[min_index]])
-            
-            for i in range(1, len(node_list)):
-                item = node_list[i]
-                in_degree = len(in_table[item])
-                
-                if in_degree < min_degree:
-                    min_index = i
-                    min_degree = in_degree
-                elif in_degree == min_degree:
-                    if node_list[min_index] in fpath_order and item in fpath_order:
-                        if fpath_order.index(item) < fpath_order.index(node_list[min_index]):
-                            min_index = i
-                    elif node_list[min_index] not in fpath_order and item not in fpath_order:
-                        if item < node_list[min_index]:
-                            min_index = i
-                    else:
-                        if item not in fpath_order:
-                            min_index = i
+        while heap:
+            degree, _, item = heapq.heappop(heap)
+            # entries are pushed again whenever a degree drops, older ones are stale
+            if in_degree.get(item) != degree:
+                continue
             
-            item = node_list[min_index]
+            in_degree.pop(item)
             sort_list.append(item)
-            
-            for x in out_table.pop(item, []):
-                if x in in_table:
-                    in_table[x].remove(item)
-            
-            in_table.pop(item, None)
+            for x in out_table[item]:
+                if x in in_degree:
+                    in_degree[x] -= 1
+                    heapq.heappush(heap, (in_degree[x], sort_key(x), x))
         
         return list(reversed(sort_list))
     
     def depthFirstSearch(self, fpath, name, max_hop=None):
-        node_dict = {}  # {fpath: set(name)}
-        file_edges = {} # {fpath: [fpath]}
-        
-        self.dfs(fpath, name, 0, node_dict, file_edges, max_hop)
-        
+        node_dict, file_edges = self._get_reachable(fpath, name, max_hop)
+        return {k: set(v) for k, v in node_dict.items()}, {k: list(v) for k, v in file_edges.items()}
+    
+    def _get_reachable(self, fpath, name, max_hop=None):
+        # reachable nodes and file edges of one seed, kept until the next set_proj
+        key = (fpath, name, max_hop)
+        item = self.reach_cache.get(key)
+        if item is not None:
+            self.reach_cache.move_to_end(key)
+            self.reach_stats["hits"] += 1
+            return item[0], item[1]
+        
+        self.reach_stats["misses"] += 1
+        node_dict, file_edges = self.traverse([(fpath, name)], max_hop)
+        node_dict = {k: frozenset(v) for k, v in node_dict.items()}
+        file_edges = {k: tuple(v) for k, v in file_edges.items()}
+        nodes = sum(len(x) for x in node_dict.values()) + sum(len(x) for x in file_edges.values())
+        if nodes > self.reach_cache_nodes or self.reach_cache_size <= 0:
+            return node_dict, file_edges
+        
+        self.reach_cache[key] = (node_dict, file_edges, nodes)
+        self.reach_used += nodes
+        while len(self.reach_cache) > self.reach_cache_size or self.reach_used > self.reach_cache_nodes:
+            _, old_item = self.reach_cache.popitem(last=False)
+            self.reach_used -= old_item[2]
+            self.reach_stats["evictions"] += 1
         return node_dict, file_edges
     
-    def dfs(self, fpath, name, depth, node_dict, file_edges, max_hop):
-
-        if fpath not in self.proj_info or name not in self.proj_info[fpath]:
-            return
-
-        if fpath in node_dict and name in node_dict[fpath]:
-            return
-
-        node_info = self.proj_info[fpath][name]
-        if fpath not in node_dict:
-            node_dict[fpath] = {name}
-        else:
-            node_dict[fpath].add(name)
-        
-        if max_hop is not None and depth+1 > max_hop:
-            return
-        
+    def get_reach_stats(self):
+        total = self.reach_stats["hits"] + self.reach_stats["misses"]
+        stats = dict(self.reach_stats)
+        stats["hit_rate"] = self.reach_stats["hits"] / total if total else 0.0
+        stats["seeds"] = len(self.reach_cache)
+        stats["nodes"] = self.reach_used
+        return stats
+    
+    def _get_targets(self, fpath, node_info):
+        # [(fpath, name or None)] a node points to, and whether the edge crosses files
+        targets = []
         if 'include' in node_info:
             include_info = node_info['include']
             
@@ -450,46 +581,112 @@ class CProjectSearcher(object):
                     t_fpath, t_name = include_info[0], None
             else:
                 t_fpath, t_name = include_info, None
+            targets.append((t_fpath, t_name, True))
+        
+        if 'rels' in node_info:
+            for item in node_info['rels']:
+                targets.append((fpath, item[0], False))
+        
+        # relations resolved into an included module by preprocess.py
+        if 'global_rels' in node_info:
+            for t_fpath, t_name, _, _ in node_info['global_rels']:
+                targets.append((t_fpath, t_name, True))
+        
+        return targets
+    
+    def traverse(self, seeds, max_hop=None):
+        node_dict = {}  # {fpath: set(name)}
+        file_edges = {} # {fpath: {fpath: None}}, ordered and deduplicated
+        
+        # explicit stack in the order the recursive walk used. With a hop limit a node keeps its
+        # smallest hop and is expanded again when a shorter path reaches it
+        hops = {}
+        stack = [(fpath, name, 0) for fpath, name in reversed(seeds)]
+        while stack:
+            fpath, name, depth = stack.pop()
             
-            if t_fpath not in file_edges:
-                file_edges[t_fpath] = []
+            last_depth = hops.get((fpath, name))
+            if last_depth is not None and (max_hop is None or last_depth <= depth):
+                continue
+            
+            node_info = self._get_node(fpath, name)
+            if node_info is None:
+                continue
             
-            if fpath not in file_edges:
-                file_edges[fpath] = [t_fpath]
+            hops[(fpath, name)] = depth
+            if fpath not in node_dict:
+                node_dict[fpath] = {name}
             else:
-                file_edges[fpath].append(t_fpath)
+                node_dict[fpath].add(name)
             
-            if t_name:
-                self.dfs(t_fpath, t_name, depth+1, node_dict, file_edges, max_hop)
-       
-        if 'rels' in node_info:
-            for item in node_info['rels']:
-                t_name = item[0]
-                self.dfs(fpath, t_name, depth+1, node_dict, file_edges, max_hop)
-    
-    def get_prompt(self, node_list, max_hop=None, only_def=True, enable_docstring=True):
+            if max_hop is not None and depth+1 > max_hop:
+                continue
+            
+            targets = self._get_targets(fpath, node_info)
+            for t_fpath, t_name, cross_file in targets:
+                if cross_file:
+                    file_edges.setdefault(t_fpath, {})
+                    file_edges.setdefault(fpath, {})[t_fpath] = None
+            
+            for t_fpath, t_name, cross_file in reversed(targets):
+                if t_name:
+                    stack.append((t_fpath, t_name, depth+1))
         
+        return node_dict, {k: list(v) for k, v in file_edges.items()}
+    
+    def _search_nodes(self, node_list, max_hop=None):
         node_dict = {}  # {fpath: set(name)}
-        file_edges = {} # {fpath: [fpath]}
-        fpath_order = []
+        file_edges = {} # {fpath: {fpath: None}}
         
         for fpath, name in node_list:
-            if fpath not in fpath_order:
-                fpath_order.append(fpath)
+            # without a hop limit a seed already reached from an earlier one adds nothing
+            if max_hop is None and name in node_dict.get(fpath, ()):
+                continue
             
-            tmp_nodes, tmp_edges = self.depthFirstSearch(fpath, name, max_hop)
+            tmp_nodes, tmp_edges = self._get_reachable(fpath, name, max_hop)
             
             for k, v in tmp_nodes.items():
                 if k not in node_dict:
-                    node_dict[k] = v
+                    node_dict[k] = set(v)
                 else:
                     node_dict[k].update(v)
             
             for k, v in tmp_edges.items():
                 if k not in file_edges:
-                    file_edges[k] = v
+                    file_edges[k] = dict.fromkeys(v)
                 else:
-                    file_edges[k].extend(v)
+                    file_edges[k].update(dict.fromkeys(v))
+        
+        return node_dict, {k: list(v) for k, v in file_edges.items()}
+    
+    def set_reach(self, reach_index):
+        # precomputed reachable sets from graph_reach.py, used when get_prompt asks for their max_hop
+        self.reach_index = reach_index
+    
+    def load_proj(self, proj_dir, graph_dir, project, max_modules=256):
+        # the graph of project in its preferred stored format, with its reachable sets when
+        # preprocess.py --reach-hops wrote them. False for an unknown project
+        proj_info, fmt = load_graph(graph_dir, project, max_modules)
+        if fmt is None:
+            return False
+        
+        self.set_proj(proj_dir, proj_info)
+        reach_file = os.path.join(graph_dir, f'{project}{REACH_SUFFIX}')
+        if read_reach_header(reach_file) is not None:
+            self.set_reach(ReachIndex(reach_file))
+        return True
+    
+    def get_prompt(self, node_list, max_hop=None, only_def=True, enable_docstring=True):
+        
+        fpath_order = []
+        for fpath, name in node_list:
+            if fpath not in fpath_order:
+                fpath_order.append(fpath)
+        
+        if self.reach_index is not None and self.reach_index.max_hop == max_hop:
+            node_dict, file_edges = self.reach_index.get_reachable(node_list)
+        else:
+            node_dict, file_edges = self._search_nodes(node_list, max_hop)
         
         sorted_files = self.pseudo_topo_sort(set(node_dict), file_edges, fpath_order)
         
@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+import tempfile
+
+
+class ParseCache(object):
+    '''
+    On-disk cache of per-file parse results, keyed by file content and the parser
+    setup, so vendored copies of the same file are parsed once across repositories.
+    Entries are plain json files; their mtime is the LRU clock.
+    '''
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, content_hash, parser_info):
+        # parser_info covers backend, parser version, parse mode, file extension, the effective
+        # per-file args and parse options, and the pch key when the file is parsed with one
+        info_hash = hashlib.sha1(json.dumps(parser_info).encode('utf-8')).hexdigest()
+        return f'{content_hash}_{info_hash}'
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        path = self._get_path(key)
+        try:
+            with open(path, 'r') as f:
+                info_dict = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return info_dict
+
+    def put(self, key, info_dict):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # written aside and renamed, several repositories may share the cache at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(info_dict, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        if not self.max_bytes:
+            return 0
+
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        return removed
+
+    def get_stats(self):
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
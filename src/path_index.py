@@ -0,0 +1,88 @@
+import os
+from bisect import bisect_left
+
+
+class PathIndex(object):
+    '''
+    Suffix lookups over the module paths of a project. The paths ending with a string
+    form one contiguous range of the sorted reversed paths, so a lookup is two
+    bisections plus the matches instead of an endswith scan over every module.
+    '''
+    def __init__(self, modules, proj_dir=''):
+        self.modules = list(modules)
+        self.proj_dir = proj_dir
+
+        reversed_paths = sorted((x[::-1], i) for i, x in enumerate(self.modules))
+        self._rkeys = [x[0] for x in reversed_paths]
+        self._rorder = [x[1] for x in reversed_paths]
+
+        self.basenames = {}
+        for module in self.modules:
+            self.basenames.setdefault(os.path.basename(module), []).append(module)
+
+        # path components relative to the project, as get_distance_paths splits them
+        self._parts = {}
+
+    def find_suffix(self, suffix):
+        # modules with path.endswith(suffix), in graph order
+        rsuffix = suffix[::-1]
+        lo = bisect_left(self._rkeys, rsuffix)
+        hi = bisect_left(self._rkeys, rsuffix + '\U0010ffff', lo)
+        return [self.modules[i] for i in sorted(self._rorder[lo:hi])]
+
+    def find_basename(self, basename):
+        return list(self.basenames.get(basename, []))
+
+    def get_parts(self, path):
+        parts = self._parts.get(path)
+        if parts is None:
+            parts = path.replace(self.proj_dir, '').split(os.sep) if self.proj_dir else path.split(os.sep)
+            self._parts[path] = parts
+        return parts
+
+    def get_distance(self, src_path, target_path):
+        src_parts = self.get_parts(src_path)
+        target_parts = self.get_parts(target_path)
+
+        common_len = 0
+        for x, y in zip(src_parts, target_parts):
+            if x != y:
+                break
+            common_len += 1
+
+        return len(src_parts) + len(target_parts) - 2 * common_len
+
+
+if __name__ == '__main__':
+    import time
+    import random
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, default=10000, help='number of module paths in the synthetic repository')
+    parser.add_argument('--lookups', type=int, default=2000, help='number of include lookups timed')
+    args = parser.parse_args()
+
+    random.seed(0)
+    dirs = [os.path.join(*(f'd{random.randrange(20)}' for _ in range(random.randint(1, 5)))) for _ in range(args.files // 8)]
+    modules = list(dict.fromkeys(os.path.join(random.choice(dirs), f'm{random.randrange(args.files)}.{random.choice("ch")}')
+                                 for _ in range(args.files)))
+    headers = [os.path.basename(x) for x in random.sample(modules, args.lookups // 2)] + \
+              [f'missing{i}.h' for i in range(args.lookups - args.lookups // 2)]
+
+    start = time.perf_counter()
+    index = PathIndex(modules)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_res = [[x for x in modules if x.endswith(h)] for h in headers]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_res = [index.find_suffix(h) for h in headers]
+    index_time = time.perf_counter() - start
+
+    assert scan_res == index_res
+    print(f'{len(modules)} modules, {len(headers)} lookups')
+    print(f'build: {build_time * 1000:.1f} ms')
+    print(f'endswith scan: {scan_time * 1000:.1f} ms, index: {index_time * 1000:.1f} ms')
@@ -1,14 +1,75 @@
 import os
 import re
 import json
-from cfile_parse import CParser
+import time
+import shutil
+import resource
+import hashlib
+import tempfile
+import multiprocessing
+from collections import Counter
+from argparse import ArgumentParser
+from cfile_parse import CParser, PARSE_MODES, HAS_LIBCLANG, load_compile_commands
+from cfile_scan import CScanParser
 from node_prompt import CProjectSearcher
-from utils import DS_REPO_DIR, DS_FILE, DS_GRAPH_DIR
+from repo_scheduler import RepoScheduler
+from parse_cache import ParseCache
+from graph_store import GRAPH_FORMATS, sync_graphs
+from graph_reach import write_reach, read_reach_header, REACH_SUFFIX
+from utils import DS_REPO_DIR, DS_FILE, DS_GRAPH_DIR, INCLUDE_MAP_SUFFIX
+
+
+MANIFEST_VERSION = 2
+
+# clang: libclang AST, scan: token scanner from cfile_scan.py that needs no libclang
+BACKENDS = {'clang': CParser, 'scan': CScanParser}
+
+
+def get_file_hash(fpath):
+    with open(fpath, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# each worker process owns its own libclang Index through this parser
+_worker_parser = None
+
+
+def _init_parse_worker(backend, parse_mode, repo_args, file_args, pch_file):
+    global _worker_parser
+    _worker_parser = BACKENDS[backend](parse_mode)
+    _worker_parser.set_project_args(repo_args, file_args, pch_file)
+
+
+def _parse_file_worker(fpath):
+    try:
+        _worker_parser.set_file_path(fpath)
+        return fpath, _worker_parser.parse(fpath), _worker_parser.last_timing
+    except Exception as e:
+        print(f"Error parsing {fpath}: {e}")
+        return fpath, {}, None
 
 
 class CProjectParser(object):
-    def __init__(self):
-        self.c_parser = CParser()
+    def __init__(self, jobs=1, pch_headers=0, parse_mode='full', backend='clang', clang_timeout=None, parse_cache=None, pch_dir=None):
+        self.backend = backend
+        self.c_parser = BACKENDS[backend](parse_mode)
+        self.jobs = max(1, jobs)
+        
+        # files libclang does not finish within clang_timeout seconds are scanned instead
+        self.clang_timeout = clang_timeout if backend == 'clang' else None
+        self.fallback_parser = CScanParser(parse_mode)
+        self.fallback_files = []
+        self.parse_cache = parse_cache
+        
+        # wall seconds per phase of the last parse_dir and libclang/visitor seconds per parsed file
+        self.phase_times = {}
+        self.file_timings = {}
+        self.pch_headers = pch_headers
+        # the precompiled header is kept in pch_dir between runs (a temporary directory when None),
+        # pch_key identifies the one in use
+        self.pch_dir = pch_dir
+        self.pch_key = None
+        self.include_pattern = re.compile(r'^\s*#\s*include\s*["<]([^">]+)[">]', re.M)
         self.file_pattern = re.compile(r'[^\w\-]')
         self.header_pattern = re.compile(r'\.(h|hpp)$')
         self.source_pattern = re.compile(r'\.(c|cpp)$')
@@ -17,6 +78,14 @@ class CProjectParser(object):
         
         self.proj_dir = None
         self.parse_res = None
+        self.manifest = None
+        self.parsed_modules = None
+        self.changed = True
+        
+        # {module: {name: [[raw name, kind]]}} relations not found in their own module,
+        # and {name: [module]} of every top-level name, for cross-file resolution
+        self.unresolved = {}
+        self.symbol_table = None
     
     def set_proj_dir(self, dir_path):
         if not dir_path.endswith(os.sep):
@@ -24,8 +93,12 @@ class CProjectParser(object):
         else:
             self.proj_dir = dir_path
     
-    def retain_project_rels(self):
+    def retain_project_rels(self, modules=None):
         for module, file_info in self.parse_res.items():
+            if modules is not None and module not in modules:
+                continue
+            
+            self.unresolved[module] = {}
             for name, info_dict in file_info.items():
                 struct_name = info_dict.get("in_struct", None)
                 
@@ -34,13 +107,14 @@ class CProjectParser(object):
                     del_index = []
                     for i, item in enumerate(rels):
                         if len(item) == 2:
-                            find_info = self.proj_searcher.name_in_file(item[0], list(file_info), name, struct_name)
+                            find_info = self.proj_searcher.find_name(module, item[0], name, struct_name)
                             if find_info is None:
                                 del_index.append(i)
+                                self.unresolved[module].setdefault(name, []).append(list(item))
                             else:
                                 info_dict["rels"][i] = [find_info[0], find_info[1], item[1]]
                         else:
-                            find_info = self.proj_searcher.name_in_file(item[0], list(file_info), name, struct_name)
+                            find_info = self.proj_searcher.find_name(module, item[0], name, struct_name)
                             if find_info is None:
                                 del_index.append(i)
                             else:
@@ -52,13 +126,142 @@ class CProjectParser(object):
                     if len(info_dict["rels"]) == 0:
                         info_dict.pop("rels")
 
+            self._retain_module_includes(module, file_info)
+    
+    def _get_include_distances(self, module, include_edges, memo):
+        # include hops from module to every module it reaches, module itself excluded. Modules
+        # including the same set of modules reach the rest at the same distances, so memo keeps
+        # one BFS per include set for the whole pass
+        targets = include_edges.get(module)
+        if not targets:
+            return {}
+        
+        key = frozenset(targets)
+        distances = memo.get(key)
+        if distances is None:
+            distances = {x: 1 for x in key}
+            frontier = list(key)
+            depth = 1
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for src in frontier:
+                    for target in include_edges.get(src, []):
+                        if target not in distances:
+                            distances[target] = depth
+                            next_frontier.append(target)
+                frontier = next_frontier
+            memo[key] = distances
+        
+        if module in distances:
+            distances = {k: v for k, v in distances.items() if k != module}
+        return distances
+    
+    def _find_global_symbol(self, name, distances):
+        # longest dotted prefix first as in find_name, then the nearest included module defining it
+        parts = name.split('.')
+        for i in range(len(parts), 0, -1):
+            item = '.'.join(parts[:i])
+            best = None
+            for module in self.symbol_table.get(item, []):
+                if module in distances and (best is None or distances[module] < distances[best]):
+                    best = module
+            
+            if best is not None:
+                return [best, item, '.'.join(parts[i:]) if i < len(parts) else None]
+        
+        return None
+    
+    def _is_global_symbol(self, module, name, info_dict):
+        # top-level declarations only: no module node, locals, struct fields or include
+        # nodes whose header was not resolved (#include <stdio.h> keeps a "stdio" node)
+        if name == module or info_dict.get("in_function", None) or info_dict.get("in_struct", None):
+            return False
+        return not info_dict.get("def", "").startswith("#include")
+    
+    def retain_global_rels(self):
+        self.symbol_table = {}
+        include_edges = {}
+        for module, file_info in self.parse_res.items():
+            for name, info_dict in file_info.items():
+                info_dict.pop("global_rels", None)
+                
                 include_info = info_dict.get("include", None)
-                if info_dict["type"] == 'Variable' and include_info is not None:
-                    judge_res = self.proj_searcher.is_local_include(module, include_info)
-                    if judge_res is None:
-                        info_dict.pop("include")
-                    else:
-                        info_dict["include"] = judge_res
+                if include_info:
+                    include_edges.setdefault(module, []).append(include_info[0])
+                elif self._is_global_symbol(module, name, info_dict):
+                    self.symbol_table.setdefault(name, []).append(module)
+        
+        # a relation only follows a symbol into modules its own module includes
+        distance_memo = {}
+        for module, unresolved in self.unresolved.items():
+            file_info = self.parse_res.get(module)
+            if not file_info or not unresolved:
+                continue
+            
+            distances = self._get_include_distances(module, include_edges, distance_memo)
+            for name, items in unresolved.items():
+                if name not in file_info:
+                    continue
+                
+                global_rels = []
+                for raw_name, kind in items:
+                    find_info = self._find_global_symbol(raw_name, distances)
+                    if find_info is not None:
+                        global_rels.append(find_info + [kind])
+                
+                if global_rels:
+                    file_info[name]["global_rels"] = global_rels
+    
+    def _retain_module_includes(self, module, file_info):
+        for name, info_dict in file_info.items():
+            include_info = info_dict.get("include", None)
+            if info_dict["type"] == 'Variable' and include_info is not None:
+                judge_res = self.proj_searcher.is_local_include(module, include_info)
+                if judge_res is None:
+                    info_dict.pop("include")
+                else:
+                    info_dict["include"] = judge_res
+    
+    def _get_raw_includes(self, file_info):
+        # unresolved header names, kept in the manifest so includes can be re-resolved later
+        includes = {}
+        for name, info_dict in file_info.items():
+            include_info = info_dict.get("include", None)
+            if info_dict["type"] == 'Variable' and include_info:
+                includes[name] = include_info[0]
+        
+        return includes
+    
+    def get_include_map(self):
+        # {header as written or its basename: {"modules": resolved modules, "includers": modules including it}}
+        include_map = {}
+        for module, entry in self.manifest["files"].items():
+            file_info = self.parse_res.get(module, {})
+            for name, header_name in entry.get("includes", {}).items():
+                include_info = file_info.get(name, {}).get("include")
+                resolved = include_info[0] if include_info else None
+                
+                for key in dict.fromkeys((header_name, os.path.basename(header_name))):
+                    item = include_map.setdefault(key, {"modules": [], "includers": []})
+                    if resolved is not None and resolved not in item["modules"]:
+                        item["modules"].append(resolved)
+                    if module not in item["includers"]:
+                        item["includers"].append(module)
+        
+        return include_map
+    
+    def _get_file_entry(self, fpath, prev_entry=None):
+        stat = os.stat(fpath)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+        
+        # only hash files whose size or mtime moved
+        if prev_entry is not None and prev_entry.get("size") == entry["size"] and prev_entry.get("mtime") == entry["mtime"]:
+            entry["hash"] = prev_entry["hash"]
+        else:
+            entry["hash"] = get_file_hash(fpath)
+        
+        return entry
     
     def _get_all_c_file_paths(self, target_path):
         if not os.path.isdir(target_path):
@@ -90,7 +293,211 @@ class CProjectParser(object):
         rel_path = fpath[len(self.proj_dir):]
         return rel_path
     
-    def parse_dir(self, c_proj_dir):
+    def _parse_files_serial(self, c_files):
+        results = {}
+        for fpath in c_files:
+            try:
+                self.c_parser.set_file_path(fpath)
+                results[fpath] = self.c_parser.parse(fpath)
+                if self.c_parser.last_timing:
+                    self.file_timings[fpath] = self.c_parser.last_timing
+            except Exception as e:
+                print(f"Error parsing {fpath}: {e}")
+        
+        return results
+    
+    def _parse_files_parallel(self, c_files):
+        # largest files are dispatched first so a big file does not end up as the tail
+        by_size = sorted(c_files, key=lambda x: os.path.getsize(x), reverse=True)
+        
+        results = {}
+        init_args = (self.backend, self.c_parser.parse_mode, self.c_parser.repo_args, self.c_parser.file_args, self.c_parser.pch_file)
+        pending = by_size
+        while pending:
+            with multiprocessing.Pool(self.jobs, initializer=_init_parse_worker, initargs=init_args) as pool:
+                # files start in dispatch order, so the one waited on is always already running
+                result_iter = pool.imap(_parse_file_worker, pending)
+                done = 0
+                try:
+                    for _ in pending:
+                        fpath, info_dict, timing = result_iter.next(timeout=self.clang_timeout)
+                        results[fpath] = info_dict
+                        if timing:
+                            self.file_timings[fpath] = timing
+                        done += 1
+                    pending = []
+                except multiprocessing.TimeoutError:
+                    # leaving the pool kills the stuck worker, the rest goes to a fresh pool
+                    slow_file = pending[done]
+                    print(f"Timeout parsing {slow_file}, falling back to the scanner")
+                    results[slow_file] = self.fallback_parser.parse(slow_file)
+                    if self.fallback_parser.last_timing:
+                        self.file_timings[slow_file] = dict(self.fallback_parser.last_timing, timeout=self.clang_timeout)
+                    self.fallback_files.append(slow_file)
+                    pending = pending[done + 1:]
+        
+        return results
+    
+    def _get_cache_key(self, fpath, content_hash):
+        # the same content parses differently as a header and as a source (skipped bodies, pch use),
+        # and a source using the pch depends on the pch's headers as well
+        file_options = self.c_parser.get_file_options(fpath)
+        parser_info = [self.backend, self.c_parser.version, self.c_parser.parse_mode, 
+                       os.path.splitext(fpath)[1], file_options, self.pch_key if file_options["pch"] else None]
+        return self.parse_cache.get_key(content_hash, parser_info)
+    
+    def _parse_files(self, c_files, file_hashes):
+        results = {}
+        cache_keys = {}
+        if self.parse_cache is not None:
+            for fpath in c_files:
+                cache_keys[fpath] = self._get_cache_key(fpath, file_hashes[fpath])
+                info_dict = self.parse_cache.get(cache_keys[fpath])
+                if info_dict is not None:
+                    info_dict[""]["file_path"] = os.path.abspath(fpath)
+                    results[fpath] = info_dict
+            c_files = [x for x in c_files if x not in results]
+        
+        self.fallback_files = []
+        if (self.jobs > 1 and len(c_files) > 1) or (self.clang_timeout and c_files):
+            parse_results = self._parse_files_parallel(c_files)
+        else:
+            parse_results = self._parse_files_serial(c_files)
+        
+        if self.parse_cache is not None:
+            fallback_set = set(self.fallback_files)
+            for fpath, info_dict in parse_results.items():
+                # failed parses and scanner fallbacks are not what the key promises
+                if info_dict and "" in info_dict and fpath not in fallback_set:
+                    module_info = {k: v for k, v in info_dict[""].items() if k != "file_path"}
+                    self.parse_cache.put(cache_keys[fpath], dict(info_dict, **{"": module_info}))
+        
+        results.update(parse_results)
+        return results
+    
+    def _get_common_headers(self, c_files):
+        header_map = {}
+        for fpath in c_files:
+            if self.header_pattern.search(fpath):
+                header_map.setdefault(os.path.basename(fpath), []).append(fpath)
+        
+        counter = Counter()
+        for fpath in c_files:
+            if not self.source_pattern.search(fpath):
+                continue
+            with open(fpath, 'r', errors='ignore') as f:
+                counter.update(set(self.include_pattern.findall(f.read())))
+        
+        headers = []
+        for name, count in counter.most_common():
+            if len(headers) >= self.pch_headers or count < 2:
+                break
+            
+            # only headers that resolve to exactly one file of the repository
+            candidates = [x for x in header_map.get(os.path.basename(name), []) if x.endswith(os.sep + name)]
+            if len(candidates) == 1:
+                headers.append(candidates[0])
+        
+        return headers
+    
+    def _set_project_args(self, c_proj_dir):
+        repo_args, file_args = load_compile_commands(c_proj_dir)
+        self.c_parser.set_project_args(repo_args, file_args)
+        self.pch_key = None
+    
+    def _get_input_stats(self, inputs):
+        # {path: [mtime, size]} as clang validates the inputs of a pch, None once one is gone
+        stats = {}
+        for fpath in inputs:
+            try:
+                stat = os.stat(fpath)
+            except OSError:
+                return None
+            stats[fpath] = [stat.st_mtime, stat.st_size]
+        return stats
+    
+    def _set_pch(self, c_files, file_entries, pch_dir):
+        # the pch of an earlier run is reused while the common headers and flags are the same and
+        # none of its inputs, transitive includes included, moved in mtime or size. pch_key adds
+        # the contents of all inputs, so parse cache entries follow any change to them
+        headers = self._get_common_headers([x for x in c_files if not self.c_parser.has_file_args(x)])
+        if not headers:
+            return
+        
+        key_info = [self.backend, self.c_parser.version, self.c_parser.args, self.c_parser.repo_args, 
+                    [[self._get_module_name(x), file_entries[self._get_module_name(x)]["hash"]] for x in headers]]
+        base_key = hashlib.sha1(json.dumps(key_info).encode('utf-8')).hexdigest()
+        pch_file = os.path.join(pch_dir, 'common.pch')
+        key_file = os.path.join(pch_dir, 'common.key')
+        
+        pch_info = None
+        if os.path.isfile(pch_file) and os.path.isfile(key_file):
+            try:
+                with open(key_file, 'r') as f:
+                    pch_info = json.load(f)
+            except ValueError:
+                pch_info = None
+        
+        if pch_info is None or pch_info.get("base") != base_key \
+                or self._get_input_stats(pch_info["inputs"]) != pch_info["inputs"]:
+            if os.path.isfile(key_file):
+                os.remove(key_file)
+            inputs = self.c_parser.build_pch(headers, pch_file)
+            if not inputs:
+                return
+            
+            input_stats = self._get_input_stats(inputs)
+            if input_stats is None:
+                return
+            key_info = [base_key, [[x, get_file_hash(x)] for x in inputs]]
+            pch_info = {"base": base_key, "key": hashlib.sha1(json.dumps(key_info).encode('utf-8')).hexdigest(), 
+                        "inputs": input_stats}
+            with open(key_file, 'w') as f:
+                json.dump(pch_info, f)
+        
+        self.pch_key = pch_info["key"]
+        self.c_parser.set_project_args(self.c_parser.repo_args, self.c_parser.file_args, pch_file)
+    
+    def get_file_args(self, fpath):
+        return self.c_parser.get_file_args(fpath)
+    
+    def parse_dir(self, c_proj_dir, prev_info=None, prev_manifest=None):
+        if self.pch_dir is not None:
+            os.makedirs(self.pch_dir, exist_ok=True)
+            return self._parse_dir(c_proj_dir, prev_info, prev_manifest, self.pch_dir)
+        
+        pch_dir = tempfile.mkdtemp(prefix='ccoder_pch_')
+        try:
+            return self._parse_dir(c_proj_dir, prev_info, prev_manifest, pch_dir)
+        finally:
+            shutil.rmtree(pch_dir, ignore_errors=True)
+    
+    def _add_phase_time(self, phase, start_time):
+        self.phase_times[phase] = self.phase_times.get(phase, 0) + time.perf_counter() - start_time
+        return time.perf_counter()
+    
+    def get_profile(self, top_n=20):
+        files = []
+        for fpath, timing in self.file_timings.items():
+            module = self._get_module_name(fpath)
+            files.append(dict(timing, module=module, nodes=len(self.parse_res.get(module, {})), 
+                              bytes=self.manifest["files"].get(module, {}).get("size", 0)))
+        files.sort(key=lambda x: x["parse"] + x["visit"], reverse=True)
+        
+        return {
+            "phases": {k: round(v, 4) for k, v in self.phase_times.items()},
+            "parse_total": round(sum(x["parse"] for x in files), 4),
+            "visit_total": round(sum(x["visit"] for x in files), 4),
+            "parsed_files": len(files),
+            "slowest_files": files[:top_n]
+        }
+    
+    def _parse_dir(self, c_proj_dir, prev_info, prev_manifest, pch_dir):
+        self.phase_times = {}
+        self.file_timings = {}
+        self.unresolved = {}
+        phase_start = time.perf_counter()
+        
         self.set_proj_dir(c_proj_dir)
         c_dict = self._get_all_c_file_paths(c_proj_dir)
         
@@ -100,26 +507,208 @@ class CProjectParser(object):
                 if os.path.isfile(fpath) and (self.header_pattern.search(fpath) or self.source_pattern.search(fpath)):
                     c_files.add(fpath)
         
+        # fixed file order keeps the graph identical between serial and parallel runs
+        c_files = sorted(c_files)
+        phase_start = self._add_phase_time("list_files", phase_start)
+        self._set_project_args(c_proj_dir)
+        phase_start = self._add_phase_time("project_args", phase_start)
+        
+        prev_files = {}
+        if prev_info is not None and prev_manifest is not None \
+                and prev_manifest.get("version") == MANIFEST_VERSION \
+                and prev_manifest.get("clang_args") == self.c_parser.args \
+                and prev_manifest.get("parse_mode") == self.c_parser.parse_mode \
+                and prev_manifest.get("backend", "clang") == self.backend:
+            prev_files = prev_manifest.get("files", {})
+        
+        file_entries = {}
+        parse_files = []
+        for fpath in c_files:
+            module = self._get_module_name(fpath)
+            prev_entry = prev_files.get(module)
+            file_entries[module] = self._get_file_entry(fpath, prev_entry)
+            
+            file_args = self.get_file_args(fpath)
+            if file_args:
+                file_entries[module]["args"] = file_args
+            
+            # failed parses and modules missing from the previous graph are always parsed again
+            if prev_entry is not None and prev_entry["hash"] == file_entries[module]["hash"] \
+                    and prev_entry.get("args") == file_entries[module].get("args") \
+                    and not prev_entry.get("failed") and module in prev_info:
+                file_entries[module]["includes"] = prev_entry.get("includes", {})
+                self.unresolved[module] = prev_entry.get("unresolved", {})
+            else:
+                parse_files.append(fpath)
+        
+        phase_start = self._add_phase_time("hash", phase_start)
+        
+        # nothing to parse, nothing to precompile
+        if self.pch_headers > 0 and parse_files:
+            self._set_pch(c_files, file_entries, pch_dir)
+            phase_start = self._add_phase_time("pch", phase_start)
+        
+        file_hashes = {x: file_entries[self._get_module_name(x)]["hash"] for x in parse_files}
+        file_results = self._parse_files(parse_files, file_hashes)
+        phase_start = self._add_phase_time("parse", phase_start)
+        
+        parse_set = set(parse_files)
         self.parse_res = {}
+        self.parsed_modules = set()
         for fpath in c_files:
             module = self._get_module_name(fpath)
+            if fpath in parse_set:
+                info_dict = file_results.get(fpath, {})
+                self.parsed_modules.add(module)
+                file_entries[module]["includes"] = self._get_raw_includes(info_dict) if info_dict else {}
+                if not info_dict:
+                    file_entries[module]["failed"] = True
+            else:
+                info_dict = prev_info.get(module)
             
-            try:
-                self.c_parser.set_file_path(fpath)
-                info_dict = self.c_parser.parse(fpath)
-                
-                if info_dict and len(info_dict) > 0:
-                    self.parse_res[module] = info_dict
-            except Exception as e:
-                print(f"Error parsing {fpath}: {e}")
+            if info_dict and len(info_dict) > 0:
+                self.parse_res[module] = info_dict
         
-        self.proj_searcher.set_proj(c_proj_dir, self.parse_res)
-        self.retain_project_rels()
+        # retain_*_rels rewrite the parsed nodes in place, so they stay plain dicts
+        self.proj_searcher.set_proj(c_proj_dir, self.parse_res, compact=False)
+        
+        if not prev_files:
+            self.retain_project_rels()
+        else:
+            self.retain_project_rels(self.parsed_modules)
+            
+            # includes of untouched modules only go stale when the module set changes
+            if set(self.parse_res) != set(prev_info):
+                for module, file_info in self.parse_res.items():
+                    if module in self.parsed_modules:
+                        continue
+                    for name, header_name in file_entries[module]["includes"].items():
+                        if name in file_info:
+                            file_info[name]["include"] = [header_name]
+                    self._retain_module_includes(module, file_info)
+        
+        phase_start = self._add_phase_time("retain_project_rels", phase_start)
+        
+        self.retain_global_rels()
+        for module, unresolved in self.unresolved.items():
+            if unresolved and module in file_entries:
+                file_entries[module]["unresolved"] = unresolved
+        self._add_phase_time("retain_global_rels", phase_start)
+        self.changed = len(self.parsed_modules) > 0 or set(file_entries) != set(prev_files)
+        self.manifest = {
+            "version": MANIFEST_VERSION,
+            "clang_args": self.c_parser.args,
+            "parse_mode": self.c_parser.parse_mode,
+            "backend": self.backend,
+            "files": file_entries
+        }
         
         return self.parse_res
 
 
+def build_repo_graph(item, dir_path, options):
+    graph_file = os.path.join(options["graph_dir"], f'{item}.json')
+    manifest_file = os.path.join(options["graph_dir"], f'{item}.manifest.json')
+    include_file = os.path.join(options["graph_dir"], f'{item}{INCLUDE_MAP_SUFFIX}')
+    
+    start_time = time.perf_counter()
+    prev_info, prev_manifest = None, None
+    if not options["full"] and os.path.isfile(graph_file) and os.path.isfile(manifest_file):
+        with open(graph_file, 'r') as f:
+            prev_info = json.load(f)
+        with open(manifest_file, 'r') as f:
+            prev_manifest = json.load(f)
+    load_time = time.perf_counter() - start_time
+    
+    parse_cache = None
+    if options["cache_dir"]:
+        parse_cache = ParseCache(options["cache_dir"])
+    
+    # the precompiled header stays next to the graph so unchanged headers are not compiled again
+    pch_dir = os.path.join(options["graph_dir"], f'{item}.pch') if options["pch"] > 0 else None
+    
+    project_parser = CProjectParser(jobs=options["jobs"], pch_headers=options["pch"], parse_mode=options["parse_mode"], 
+                                    backend=options["backend"], clang_timeout=options["clang_timeout"], 
+                                    parse_cache=parse_cache, pch_dir=pch_dir)
+    info = project_parser.parse_dir(dir_path, prev_info, prev_manifest)
+    
+    stats = {
+        "status": "built",
+        "files": len(project_parser.manifest["files"]),
+        "parsed": len(project_parser.parsed_modules),
+        "fallback": len(project_parser.fallback_files),
+        "nodes": sum(len(x) for x in info.values())
+    }
+    if parse_cache is not None:
+        stats.update(parse_cache.get_stats())
+    
+    if prev_info is not None and not project_parser.changed:
+        print(f'{item} is up to date.')
+        stats["status"] = "up_to_date"
+    else:
+        print(f'{item}: re-parsed {len(project_parser.parsed_modules)} files.')
+        if project_parser.fallback_files:
+            print(f'{item}: {len(project_parser.fallback_files)} files timed out in libclang and were scanned.')
+        
+        dump_start = time.perf_counter()
+        with open(graph_file, 'w') as f:
+            json.dump(info, f)
+        with open(manifest_file, 'w') as f:
+            json.dump(project_parser.manifest, f)
+        project_parser.phase_times["json_dump"] = time.perf_counter() - dump_start
+    
+    # graphs built before the include map existed get one on their next up-to-date check
+    if stats["status"] == "built" or not os.path.isfile(include_file):
+        with open(include_file, 'w') as f:
+            json.dump(project_parser.get_include_map(), f)
+    
+    dump_times = sync_graphs(info, options["graph_dir"], item, options["formats"], stats["status"] == "built")
+    for fmt, seconds in dump_times.items():
+        project_parser.phase_times[f"{fmt}_dump"] = seconds
+    
+    # a reach file for another hop count is stale as well
+    reach_file = os.path.join(options["graph_dir"], f'{item}{REACH_SUFFIX}')
+    if options["reach_hops"] is not None:
+        header = read_reach_header(reach_file) if stats["status"] != "built" else None
+        if header is None or header["max_hop"] != options["reach_hops"]:
+            dump_start = time.perf_counter()
+            write_reach(project_parser.proj_searcher, reach_file, options["reach_hops"])
+            project_parser.phase_times["reach_dump"] = time.perf_counter() - dump_start
+    elif stats["status"] == "built" and os.path.isfile(reach_file):
+        os.remove(reach_file)
+    
+    if options["profile"]:
+        project_parser.phase_times["json_load"] = load_time
+        stats["profile"] = project_parser.get_profile(options["profile_top"])
+        # ru_maxrss is in KB on linux, children cover the parse pool workers
+        stats["profile"]["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        stats["profile"]["peak_rss_workers"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    
+    return stats
+
+
 if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes used to parse files of a repository')
+    parser.add_argument('--full', action='store_true', help='ignore existing manifests and rebuild every graph from scratch')
+    parser.add_argument('--parse-mode', choices=PARSE_MODES, default='full', 
+                        help='full parses every function body, headers skips bodies in headers, decl skips them everywhere; skipped definitions lose their body and locals and are marked body_skipped')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='clang', help='clang for the libclang AST, scan for the libclang-free token scanner')
+    parser.add_argument('--clang-timeout', type=float, default=None, help='seconds after which a file libclang is still parsing is scanned instead')
+    parser.add_argument('--pch', type=int, default=0, help='precompile the N most commonly included headers of each repository, 0 to disable')
+    parser.add_argument('--repo-jobs', type=int, default=1, help='number of repositories processed concurrently')
+    parser.add_argument('--repo-timeout', type=float, default=None, help='seconds after which a repository is killed')
+    parser.add_argument('--repo-max-rss', type=float, default=None, help='memory cap of a repository in MB, the repository is killed above it')
+    parser.add_argument('--cache-dir', default=None, help='directory of the per-file parse cache shared by all repositories, disabled when not set')
+    parser.add_argument('--cache-max-mb', type=float, default=None, help='size limit of the parse cache in MB, least recently used entries are evicted')
+    parser.add_argument('--profile', action='store_true', help='record per-file and per-phase timings into c_graph_profile.json')
+    parser.add_argument('--profile-top', type=int, default=20, help='number of slowest files kept per repository and overall in the profile')
+    parser.add_argument('--format', choices=list(GRAPH_FORMATS), action='append', default=[], 
+                        help='also write the graph in this stored format (see graph_store.py), may be given several times; CGenerator prefers sqlite, then shards, then binary over the json graph')
+    parser.add_argument('--reach-hops', type=int, default=None, 
+                        help='also precompute every node\'s reachable set up to this many hops into <pkg>.reach, used by CProjectSearcher.get_prompt with the same max_hop')
+    parser.add_argument('--retries', type=int, default=1, help='times a failed repository is queued again')
+    args = parser.parse_args()
     
     with open(DS_FILE, 'r') as f:
         ds = [json.loads(line) for line in f.readlines()]
@@ -127,33 +716,79 @@ if __name__ == '__main__':
     pkg_set = set([x['pkg'] for x in ds])
     print(f'There are {len(pkg_set)} repositories in dataset.')
     
-    project_parser = CProjectParser()
+    backend = args.backend
+    if backend == 'clang' and not HAS_LIBCLANG:
+        print('libclang is not available, using the scan backend.')
+        backend = 'scan'
+    
+    options = {
+        "graph_dir": DS_GRAPH_DIR,
+        "full": args.full,
+        "jobs": args.jobs,
+        "pch": args.pch,
+        "parse_mode": args.parse_mode,
+        "backend": backend,
+        "clang_timeout": args.clang_timeout,
+        "cache_dir": args.cache_dir,
+        "profile": args.profile,
+        "profile_top": args.profile_top,
+        "formats": args.format,
+        "reach_hops": args.reach_hops
+    }
     
     if not os.path.isdir(DS_GRAPH_DIR):
         os.mkdir(DS_GRAPH_DIR)
     
+    repos = []
     for item in os.listdir(DS_REPO_DIR):
-        if item not in pkg_set:
-            continue
-        
         dir_path = os.path.join(DS_REPO_DIR, item)
-        if os.path.isdir(dir_path):
-            try:
-                info = project_parser.parse_dir(dir_path)
-                
-                with open(os.path.join(DS_GRAPH_DIR, f'{item}.json'), 'w') as f:
-                    json.dump(info, f)
-            except Exception as e:
-                print(f"Error processing {item}: {e}")
+        if item in pkg_set and os.path.isdir(dir_path):
+            repos.append((item, dir_path))
     
-    import os
+    max_rss = int(args.repo_max_rss * 1024 * 1024) if args.repo_max_rss else None
+    scheduler = RepoScheduler(build_repo_graph, workers=args.repo_jobs, timeout=args.repo_timeout, 
+                              max_rss=max_rss, retries=args.retries)
+    report = scheduler.run(repos, options)
+    
+    if args.cache_dir:
+        hits = sum(x.get("cache_hits", 0) for x in report["repos"].values())
+        misses = sum(x.get("cache_misses", 0) for x in report["repos"].values())
+        report["summary"]["cache_hits"] = hits
+        report["summary"]["cache_misses"] = misses
+        
+        max_bytes = int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+        evicted = ParseCache(args.cache_dir, max_bytes).evict()
+        print(f'Parse cache: {hits} hits, {misses} misses, {evicted} entries evicted.')
+    
+    if args.profile:
+        # profiles go to their own file, the report keeps the per-repo summary
+        profiles = {k: v.pop("profile") for k, v in report["repos"].items() if "profile" in v}
+        slowest = [dict(x, repo=k) for k, v in profiles.items() for x in v["slowest_files"]]
+        slowest.sort(key=lambda x: x["parse"] + x["visit"], reverse=True)
+        
+        phases = {}
+        for profile in profiles.values():
+            for phase, seconds in profile["phases"].items():
+                phases[phase] = round(phases.get(phase, 0) + seconds, 4)
+        
+        profile_file = f'{DS_GRAPH_DIR}_profile.json'
+        with open(profile_file, 'w') as f:
+            json.dump({"phases": phases, "slowest_files": slowest[:args.profile_top], "repos": profiles}, f, indent=2)
+        print(f'Profile saved to {profile_file}')
+    
+    report_file = f'{DS_GRAPH_DIR}_report.json'
+    with open(report_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    if report["summary"]["failed"]:
+        print(f'Failed repositories: {", ".join(report["summary"]["failed"])}')
+    print(f'Report saved to {report_file}')
 
     visible_files = [
         f for f in os.listdir(DS_GRAPH_DIR)
         if not f.startswith('.') 
+        and f.endswith('.json') and not f.endswith('.manifest.json') and not f.endswith(INCLUDE_MAP_SUFFIX)
         and os.path.isfile(os.path.join(DS_GRAPH_DIR, f))  
     ]
 
     print(f'Generated repo-specific context graph for {len(visible_files)} repositories.')
-
-    
\ No newline at end of file
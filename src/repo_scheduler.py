@@ -0,0 +1,184 @@
+import os
+import time
+import signal
+import traceback
+import multiprocessing
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def get_source_size(dir_path, suffixes=('.c', '.h', '.cpp', '.hpp')):
+    total = 0
+    for root, dirs, files in os.walk(dir_path):
+        dirs[:] = [x for x in dirs if not x.startswith('.')]
+        for name in files:
+            if name.endswith(suffixes):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+def get_rss(pid):
+    # resident memory of a job in bytes, including its parse workers when psutil is available
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            return proc.memory_info().rss + sum(x.memory_info().rss for x in proc.children(recursive=True))
+        except psutil.Error:
+            return 0
+
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _run_job(target, item, dir_path, options, conn):
+    # own process group, so killing a job also kills the parse pool it started
+    os.setpgrp()
+    try:
+        stats = target(item, dir_path, options)
+        conn.send(stats)
+    except Exception as e:
+        traceback.print_exc()
+        conn.send({"status": "failed", "error": repr(e)})
+    finally:
+        conn.close()
+
+
+class RepoJob(object):
+    def __init__(self, item, dir_path, size):
+        self.item = item
+        self.dir_path = dir_path
+        self.size = size
+        self.attempts = 0
+
+        self.process = None
+        self.conn = None
+        self.start_time = None
+        self.peak_rss = 0
+        self.result = None
+
+
+class RepoScheduler(object):
+    '''
+    Runs target(item, dir_path, options) for many repositories in separate processes,
+    largest repositories first, with a per-repo timeout and RSS cap. Failed repositories
+    are queued again up to `retries` times.
+    '''
+    def __init__(self, target, workers=1, timeout=None, max_rss=None, retries=1, poll_interval=0.2):
+        self.target = target
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.retries = retries
+        self.poll_interval = poll_interval
+
+        if max_rss and psutil is None:
+            print('psutil is not installed, the RSS cap only covers the repository process itself.')
+
+    def _start(self, job, options):
+        recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+        job.attempts += 1
+        job.conn = recv_conn
+        job.peak_rss = 0
+        job.result = None
+        job.start_time = time.time()
+        job.process = multiprocessing.Process(target=_run_job, args=(self.target, job.item, job.dir_path, options, send_conn))
+        job.process.start()
+        send_conn.close()
+
+    def _kill(self, job):
+        try:
+            os.killpg(job.process.pid, signal.SIGKILL)
+        except OSError:
+            job.process.kill()
+        job.process.join()
+
+    def _receive(self, job):
+        if job.result is None and job.conn.poll():
+            try:
+                job.result = job.conn.recv()
+            except EOFError:
+                pass
+
+    def _check(self, job):
+        # None while the job is still running, else its result dict
+        self._receive(job)
+
+        if not job.process.is_alive() or job.result is not None:
+            job.process.join()
+            # the result may have been sent between the poll and the exit
+            self._receive(job)
+            if job.result is None:
+                return {"status": "failed", "error": f"exit code {job.process.exitcode}"}
+            return job.result
+
+        if self.timeout and time.time() - job.start_time > self.timeout:
+            self._kill(job)
+            return {"status": "timeout", "error": f"exceeded {self.timeout}s"}
+
+        rss = get_rss(job.process.pid)
+        job.peak_rss = max(job.peak_rss, rss)
+        if self.max_rss and rss > self.max_rss:
+            self._kill(job)
+            return {"status": "rss", "error": f"exceeded {self.max_rss} bytes"}
+
+        return None
+
+    def run(self, repos, options):
+        start_time = time.time()
+        queue = [RepoJob(item, dir_path, get_source_size(dir_path)) for item, dir_path in repos]
+        queue.sort(key=lambda x: x.size, reverse=True)
+
+        report = {}
+        running = []
+        while queue or running:
+            while queue and len(running) < self.workers:
+                job = queue.pop(0)
+                self._start(job, options)
+                running.append(job)
+
+            time.sleep(self.poll_interval)
+
+            for job in list(running):
+                result = self._check(job)
+                if result is None:
+                    continue
+
+                running.remove(job)
+                job.conn.close()
+
+                result = dict(result)
+                result["time"] = round(time.time() - job.start_time, 3)
+                result["attempts"] = job.attempts
+                result["source_bytes"] = job.size
+                if job.peak_rss:
+                    result["peak_rss"] = job.peak_rss
+                report[job.item] = result
+
+                if result.get("status") in ("failed", "timeout", "rss"):
+                    print(f"Error processing {job.item}: {result.get('error')}")
+                    if job.attempts <= self.retries:
+                        queue.append(job)
+
+        failed = sorted(k for k, v in report.items() if v.get("status") in ("failed", "timeout", "rss"))
+        return {
+            "summary": {
+                "repos": len(report),
+                "failed": failed,
+                "time": round(time.time() - start_time, 3),
+                "files": sum(v.get("files", 0) for v in report.values()),
+                "nodes": sum(v.get("nodes", 0) for v in report.values())
+            },
+            "repos": report
+        }
@@ -6,6 +6,20 @@ ONLY_DEF = True
 ENABLE_DOCSTRING = True
 LAST_K_LINES = 1
 
+# memory budget of the project graphs CGenerator keeps loaded
+GRAPH_CACHE_MB = 2048
+
+# rendered per-module prompt fragments CProjectSearcher keeps, by count and by size (characters)
+FRAGMENT_CACHE_SIZE = 4096
+FRAGMENT_CACHE_MB = 64
+
+# reachable sets of single seeds CProjectSearcher keeps, by count and by reachable nodes and file edges
+REACH_CACHE_SIZE = 4096
+REACH_CACHE_NODES = 2**22
+
+# header -> (resolved modules, includer modules) map written next to each graph
+INCLUDE_MAP_SUFFIX = '.includes.json'
+
 import os
 # MODEL = "codellama7b"
 MODEL = "deepseek"
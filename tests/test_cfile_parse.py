@@ -0,0 +1,52 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cfile_parse import CParser, HAS_LIBCLANG
+
+
+SOURCE = '''/* add two numbers */
+int add(int a, int b)
+{
+    return a + b;
+}
+
+int sub(int a, int b);
+
+static int twice(int a) { return add(a, a); }
+'''
+
+
+@unittest.skipUnless(HAS_LIBCLANG, "libclang is not available")
+class TestSkippedBodies(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.c_file = os.path.join(self.tmp_dir, 'calc.c')
+        with open(self.c_file, 'w') as f:
+            f.write(SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_decl_mode_marks_skipped_bodies(self):
+        info = CParser(parse_mode='decl').parse(self.c_file)
+        self.assertTrue(info["add"].get("body_skipped"))
+        self.assertEqual(info["add"]["def"], "int add(int a, int b)")
+        self.assertEqual(info["add"].get("docstring"), "/* add two numbers */")
+        self.assertTrue(info["twice"].get("body_skipped"))
+        self.assertNotIn("body", info["add"])
+        # a prototype has no body to skip
+        self.assertNotIn("body_skipped", info["sub"])
+
+    def test_full_mode_keeps_bodies(self):
+        info = CParser(parse_mode='full').parse(self.c_file)
+        self.assertIn("return a + b;", info["add"]["body"])
+        self.assertNotIn("body_skipped", info["add"])
+
+
+if __name__ == '__main__':
+    unittest.main()
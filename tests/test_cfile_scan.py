@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cfile_scan import CScanVisitor
+
+
+def scan(code):
+    visitor = CScanVisitor()
+    visitor.set_code(code.encode('utf-8'))
+    return visitor.visit_root()
+
+
+class TestFunctionDefinitions(unittest.TestCase):
+    def test_attribute_before_name(self):
+        info = scan('void __attribute__((weak)) SysTick_Handler(void) { tick++; }\n'
+                    'int main(void) { return 0; }\n'
+                    'int after;\n')
+        self.assertEqual(info["SysTick_Handler"]["type"], "Function")
+        self.assertEqual(info["SysTick_Handler"]["body"], "{ tick++; }")
+        self.assertEqual(info["main"]["def"], "int main(void)")
+        self.assertEqual(info["after"]["def"], "int after")
+
+    def test_section_macro(self):
+        info = scan('RT_SECTION(".text") void f(void) {}\nint after;\n')
+        self.assertNotIn("RT_SECTION", info)
+        self.assertEqual(info["f"]["def"], 'RT_SECTION(".text") void f(void)')
+        self.assertNotIn("rels", info["f"])
+        self.assertEqual(info["after"]["def"], "int after")
+
+    def test_knr_definition(self):
+        info = scan('int add(a, b)\nint a;\nchar *b;\n{\n    return a + b;\n}\nint next;\n')
+        self.assertEqual(info["add"]["type"], "Function")
+        self.assertEqual(info["add"]["rels"], [["int", "Typeof"]])
+        self.assertIn("return a + b;", info["add"]["body"])
+        self.assertNotIn("a", info)
+        self.assertNotIn("b", info)
+        self.assertEqual(info["next"]["def"], "int next")
+
+    def test_function_returning_function_pointer(self):
+        info = scan('static void (*get_cb(int i))(int) {\n    return cbs[i];\n}\nint after;\n')
+        self.assertEqual(info["get_cb"]["def"], "static void (*get_cb(int i))(int)")
+        self.assertEqual(info["get_cb"]["rels"], [["void (*)(int)", "Typeof"]])
+        self.assertEqual(info["after"]["def"], "int after")
+
+    def test_unknown_brace_block_ends_statement(self):
+        info = scan('MODULE_INIT {\n    setup();\n}\nint after;\n')
+        self.assertEqual(info["after"]["def"], "int after")
+
+    def test_aggregates_and_initializers_continue(self):
+        info = scan('struct point { int x; } origin;\nint arr[] = {1, 2};\nvoid (*fp)(int);\n'
+                    'int f(void) __attribute__((noreturn));\n')
+        self.assertEqual(info["origin"]["rels"], [["struct point", "Typeof"]])
+        self.assertEqual(info["arr"]["def"], "int arr[] = {1, 2}")
+        self.assertEqual(info["fp"]["type"], "Variable")
+        self.assertEqual(info["f"]["type"], "Function")
+        self.assertEqual(info["f"]["rels"], [["int", "Typeof"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from preprocess import CProjectParser
+
+
+class TestGlobalSymbolTable(unittest.TestCase):
+    def test_field_does_not_shadow_global_function(self):
+        # struct job { int run; } next to a global function job(), as libclang reports a job.run member access
+        parser = CProjectParser(backend='scan')
+        parser.parse_res = {
+            "main.c": {
+                "task": {"type": "Variable", "def": '#include "task.h"', "sline": 1, "include": ["task.h", None]},
+                "api": {"type": "Variable", "def": '#include "api.h"', "sline": 2, "include": ["api.h", None]},
+                "total": {"type": "Variable", "def": "int total = job.run", "sline": 3}
+            },
+            "task.h": {
+                "job": {"type": "Struct", "def": "struct job {\n    int run;\n}", "sline": 1},
+                "job.run": {"type": "Variable", "def": "int run", "sline": 2, "in_struct": "job"}
+            },
+            "api.h": {
+                "job": {"type": "Function", "def": "int job(void)", "sline": 1}
+            }
+        }
+        parser.unresolved = {"main.c": {"total": [["job.run", "Assign"]]}}
+        parser.retain_global_rels()
+
+        self.assertNotIn("job.run", parser.symbol_table)
+        self.assertEqual(sorted(parser.symbol_table["job"]), ["api.h", "task.h"])
+        global_rels = parser.parse_res["main.c"]["total"]["global_rels"]
+        self.assertEqual([x[1:] for x in global_rels], [["job", "run", "Assign"]])
+
+    def test_unresolved_include_is_not_a_symbol(self):
+        proj_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(proj_dir, 'api.h'), 'w') as f:
+                f.write('#include <stdio.h>\nint run(void);\n')
+            with open(os.path.join(proj_dir, 'main.c'), 'w') as f:
+                f.write('#include "api.h"\nint total = run;\nint s = stdio;\n')
+
+            parser = CProjectParser(backend='scan')
+            info = parser.parse_dir(proj_dir)
+        finally:
+            shutil.rmtree(proj_dir)
+
+        self.assertNotIn("stdio", parser.symbol_table)
+        self.assertNotIn("global_rels", info["main.c"]["s"])
+        self.assertEqual(info["main.c"]["total"]["global_rels"], [["api.h", "run", None, "Assign"]])
+
+
+if __name__ == '__main__':
+    unittest.main()